@@ -3,11 +3,42 @@ Streamlit Web Application for Car Manual Q&A
 """
 
 import streamlit as st
+import bisect
+import logging
 import os
 from pdf_processor import PDFProcessor, detect_car_model
-from search_engine import ManualSearchEngine
+from search_engine import (
+    ManualSearchEngine, DEFAULT_MODEL_NAME, load_embedding_model,
+    compile_embedding_model, quantize_embedding_model
+)
 from qa_system import QASystem
 from rag_qa_system import RAGQASystem
+from embedding_batcher import EmbeddingBatcher
+
+
+# Show search engine progress (index builds, loads and warnings) in the server log;
+# guarded because Streamlit re-runs this script on every interaction
+_search_logger = logging.getLogger("search_engine")
+if not _search_logger.handlers:
+    _search_logger.addHandler(logging.StreamHandler())
+    _search_logger.setLevel(logging.INFO)
+
+# (metrics key, label, help text) for each per-metric column
+METRIC_SPEC = [
+    ("answer_relevance", "🎯 Answer Relevance", "How well the answer addresses the question"),
+    ("faithfulness", "✓ Faithfulness", "How well the answer is grounded in the manual (no hallucinations)"),
+    ("context_relevance", "📄 Context Quality", "Relevance of retrieved manual sections"),
+]
+OVERALL_SCORE_HELP = "Weighted average of all metrics"
+
+# Score thresholds and the indicator for each bucket (<0.4, <0.6, <0.8, >=0.8)
+_SCORE_BUCKETS = [0.4, 0.6, 0.8]
+_SCORE_EMOJIS = ["🔴", "🟠", "🟡", "🟢"]
+
+
+def score_emoji(score: float) -> str:
+    """Quality indicator emoji for an overall score."""
+    return _SCORE_EMOJIS[bisect.bisect_right(_SCORE_BUCKETS, score)]
 
 
 # Page configuration
@@ -26,23 +57,41 @@ if 'manuals_loaded' not in st.session_state:
     st.session_state.manuals_loaded = False
 
 
-@st.cache_resource
-def load_manuals():
-    """Load and process car manuals."""
+# Processed data first, then each manual's PDF (current directory, then parent)
+PROCESSED_MANUALS_PATH = "processed_manuals.json"
+ASTOR_PATHS = ["Astor Manual.pdf", "../Astor Manual.pdf"]
+TIAGO_PATHS = ["APP-TIAGO-FINAL-OMSB.pdf", "../APP-TIAGO-FINAL-OMSB.pdf"]
+
+
+def manuals_source_key():
+    """(path, mtime_ns, size) of every manuals source file that exists, to key the data cache."""
+    key = []
+    for path in [PROCESSED_MANUALS_PATH] + ASTOR_PATHS + TIAGO_PATHS:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            key.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(key)
+
+
+@st.cache_data(persist="disk", show_spinner=False)
+def load_manuals(source_key=()):
+    """
+    Load and process car manuals (persisted to disk across restarts).
+    
+    Args:
+        source_key: manuals_source_key() of the files on disk; a regenerated
+            processed_manuals.json or a changed PDF misses the cache
+    """
     processor = PDFProcessor()
     
     # Check if processed data exists
-    if os.path.exists("processed_manuals.json"):
+    if os.path.exists(PROCESSED_MANUALS_PATH):
         print("Loading pre-processed manuals...")
         manuals_data = processor.load_processed_data()
     else:
         print("Processing manuals from PDFs...")
-        # Process manuals - check current directory first, then parent
-        astor_paths = ["Astor Manual.pdf", "../Astor Manual.pdf"]
-        tiago_paths = ["APP-TIAGO-FINAL-OMSB.pdf", "../APP-TIAGO-FINAL-OMSB.pdf"]
-        
-        astor_path = next((p for p in astor_paths if os.path.exists(p)), None)
-        tiago_path = next((p for p in tiago_paths if os.path.exists(p)), None)
+        astor_path = next((p for p in ASTOR_PATHS if os.path.exists(p)), None)
+        tiago_path = next((p for p in TIAGO_PATHS if os.path.exists(p)), None)
         
         if astor_path:
             processor.process_manual(astor_path, "MG Astor")
@@ -56,12 +105,35 @@ def load_manuals():
     return manuals_data
 
 
+@st.cache_resource
+def _embedding_model():
+    """Load the sentence transformer once and share it across sessions."""
+    model = load_embedding_model(DEFAULT_MODEL_NAME)
+    precision = os.getenv("EMBEDDING_PRECISION", "float32").lower()
+    if precision != "float32":
+        model = quantize_embedding_model(model, precision)
+    if os.getenv("TORCH_COMPILE", "").lower() == "true":
+        model = compile_embedding_model(model)
+    return model
+
+
+@st.cache_resource
+def _embedding_batcher():
+    """Single batching worker per process, shared by all sessions' searches and evaluators."""
+    return EmbeddingBatcher(_embedding_model())
+
+
 def initialize_search_engine():
     """Initialize the search engine with optimized index loading."""
     if st.session_state.search_engine is None:
         with st.spinner("Initializing search engine..."):
-            manuals_data = load_manuals()
-            search_engine = ManualSearchEngine()
+            manuals_data = load_manuals(manuals_source_key())
+            embedding_model = _embedding_model()
+            search_engine = ManualSearchEngine(
+                model=embedding_model,
+                quantization=os.getenv("INDEX_QUANTIZATION") or None,
+                query_encoder=_embedding_batcher()
+            )
             # build_index will automatically load cached index if available
             search_engine.build_index(manuals_data)
             st.session_state.search_engine = search_engine
@@ -71,11 +143,48 @@ def initialize_search_engine():
             if st.session_state.qa_system is None:
                 use_rag = os.getenv("OPENAI_API_KEY") or os.getenv("USE_OLLAMA", "").lower() == "true"
                 if use_rag:
-                    st.session_state.qa_system = RAGQASystem(use_llm=True, embedding_model=search_engine.model)
+                    st.session_state.qa_system = RAGQASystem(use_llm=True, embedding_model=_embedding_batcher())
                 else:
                     st.session_state.qa_system = QASystem()
 
 
+def render_metrics(metrics):
+    """Render the answer quality metrics panel."""
+    # Skipped evaluations are shown as N/A rather than 0%
+    skipped = metrics.get("skipped", False)
+    
+    st.markdown("### 📊 Answer Quality Metrics")
+    
+    # Create metrics row
+    metric_cols = st.columns(len(METRIC_SPEC) + 1)
+    
+    for col, (key, label, help_text) in zip(metric_cols, METRIC_SPEC):
+        with col:
+            score = metrics.get(key, 0)
+            st.metric(
+                label,
+                "N/A" if skipped else f"{score:.0%}",
+                help=help_text
+            )
+    
+    with metric_cols[-1]:
+        score = metrics.get("overall_score", 0)
+        emoji = "⚪" if skipped else score_emoji(score)
+        st.metric(
+            f"{emoji} Overall Quality",
+            "N/A" if skipped else f"{score:.0%}",
+            help=OVERALL_SCORE_HELP
+        )
+
+
+def render_citations(citations):
+    """Render the cited manual sections as expanders."""
+    st.subheader("📖 Sources")
+    for citation in citations:
+        with st.expander(f"Source {citation['citation_number']} - {citation['car_model']}"):
+            st.write(citation["excerpt"])
+
+
 def main():
     """Main application function."""
     st.title("🚗 Car Manual Q&A System")
@@ -190,61 +299,12 @@ def main():
                                 response_time = answer_data["response_time"]
                                 st.metric("⏱️ Response Time", f"{response_time:.2f}s")
                         
-                        # Display evaluation metrics
+                        # Metrics and sources re-run on their own, not with the whole app
                         if "metrics" in answer_data and answer_data["metrics"]:
-                            metrics = answer_data["metrics"]
-                            
-                            st.markdown("### 📊 Answer Quality Metrics")
-                            
-                            # Create metrics row
-                            metric_cols = st.columns(4)
-                            
-                            with metric_cols[0]:
-                                score = metrics.get("answer_relevance", 0)
-                                st.metric(
-                                    "🎯 Answer Relevance",
-                                    f"{score:.0%}",
-                                    help="How well the answer addresses the question"
-                                )
-                            
-                            with metric_cols[1]:
-                                score = metrics.get("faithfulness", 0)
-                                st.metric(
-                                    "✓ Faithfulness",
-                                    f"{score:.0%}",
-                                    help="How well the answer is grounded in the manual (no hallucinations)"
-                                )
-                            
-                            with metric_cols[2]:
-                                score = metrics.get("context_relevance", 0)
-                                st.metric(
-                                    "📄 Context Quality",
-                                    f"{score:.0%}",
-                                    help="Relevance of retrieved manual sections"
-                                )
-                            
-                            with metric_cols[3]:
-                                score = metrics.get("overall_score", 0)
-                                if score >= 0.8:
-                                    emoji = "🟢"
-                                elif score >= 0.6:
-                                    emoji = "🟡"
-                                elif score >= 0.4:
-                                    emoji = "🟠"
-                                else:
-                                    emoji = "🔴"
-                                st.metric(
-                                    f"{emoji} Overall Quality",
-                                    f"{score:.0%}",
-                                    help="Weighted average of all metrics"
-                                )
+                            render_metrics(answer_data["metrics"])
                         
-                        # Display citations
                         if answer_data["citations"]:
-                            st.subheader("📖 Sources")
-                            for citation in answer_data["citations"]:
-                                with st.expander(f"Source {citation['citation_number']} - {citation['car_model']}"):
-                                    st.write(citation["excerpt"])
+                            render_citations(answer_data["citations"])
                         
                     except Exception as e:
                         st.error(f"Error processing question: {e}")
@@ -0,0 +1,150 @@
+"""
+Embedding Batcher Module
+Coalesces concurrent encode requests into batched model calls.
+"""
+
+import time
+import queue
+import contextlib
+import threading
+import numpy as np
+from concurrent.futures import Future
+
+
+def _inference_mode():
+    """Torch inference mode for the calling thread, or a no-op without torch."""
+    try:
+        import torch
+    except ImportError:
+        return contextlib.nullcontext()
+    return torch.inference_mode()
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches encode calls from many threads into shared forward passes.
+    
+    A single background worker drains queued texts, waiting at most
+    max_wait_ms for more to arrive, and encodes up to max_batch of them in
+    one model call. Exposes an encode() method compatible with
+    SentenceTransformer.encode so it can be used wherever a model is expected.
+    """
+    
+    def __init__(self, model, max_batch: int = 64, max_wait_ms: float = 5.0):
+        """
+        Initialize the batcher.
+        
+        Args:
+            model: SentenceTransformer model used for encoding
+            max_batch: Maximum number of texts per model call
+            max_wait_ms: Maximum time to wait for a batch to fill up
+        """
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+    
+    def encode(self, sentences, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """
+        Encode texts through the shared batching worker.
+        
+        Batch size, progress bar and output format are controlled by the
+        batcher; other keyword arguments are accepted for compatibility.
+        
+        Args:
+            sentences: A text or list of texts
+            normalize_embeddings: Whether to L2-normalize the embeddings
+        
+        Returns:
+            Embedding array (one row per text, or a vector for a single text)
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return self.model.encode(texts, normalize_embeddings=normalize_embeddings, **kwargs)
+        
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, normalize_embeddings, future))
+            futures.append(future)
+        # Started after queueing, so texts queued as a failed worker exits are
+        # either failed by it or picked up by its replacement
+        self._ensure_worker()
+        
+        embeddings = np.stack([future.result() for future in futures])
+        return embeddings[0] if single else embeddings
+    
+    def _ensure_worker(self):
+        """Start the background worker thread on first use."""
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(
+                        target=self._run, name="embedding-batcher", daemon=True
+                    )
+                    self._worker.start()
+    
+    def _run(self):
+        """
+        Collect queued texts into batches and encode them.
+        
+        If the loop ever exits with an error, the worker is cleared for the
+        next encode() to restart and every pending text gets the exception,
+        so no caller waits on a future nobody will resolve.
+        """
+        items = []
+        try:
+            while True:
+                items = [self._queue.get()]
+                deadline = time.monotonic() + self.max_wait
+                
+                while len(items) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        items.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                
+                self._process(items)
+                items = []
+        except BaseException as e:
+            with self._lock:
+                self._worker = None
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+    
+    def _process(self, items):
+        """Encode one batch, grouped by normalization setting, and resolve futures."""
+        for normalize in (False, True):
+            group = [item for item in items if item[1] == normalize]
+            if not group:
+                continue
+            
+            try:
+                # Inference mode is per thread and skips autograd bookkeeping
+                with _inference_mode():
+                    embeddings = self.model.encode(
+                        [text for text, _, _ in group],
+                        batch_size=len(group),
+                        convert_to_numpy=True,
+                        normalize_embeddings=normalize,
+                        show_progress_bar=False
+                    )
+            except Exception as e:
+                for _, _, future in group:
+                    future.set_exception(e)
+                continue
+            
+            for (_, _, future), embedding in zip(group, embeddings):
+                future.set_result(embedding)
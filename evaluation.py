@@ -3,12 +3,45 @@ Evaluation Module
 Provides metrics to evaluate answer quality in the RAG system.
 """
 
+import re
 import time
+import inspect
+import hashlib
 import numpy as np
-from typing import Dict, List, Tuple
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union, AbstractSet
 from functools import wraps
 
 
+# Texts longer than this share a cache entry with their prefix; the
+# embedding model truncates its input well before this length anyway.
+_MAX_CACHED_TEXT_LENGTH = 4096
+
+# A sentence is a run of non-terminators followed by terminators or end of text
+_SENTENCE_RE = re.compile(r'[^.!?]+(?:[.!?]+|$)')
+
+# Answers starting with this are "not found" fallbacks and carry nothing to evaluate
+NOT_FOUND_PREFIX = "I couldn't find"
+
+# Overall score weights, in the order of _WEIGHT_KEYS
+_WEIGHT_KEYS = ('answer_relevance', 'faithfulness', 'context_relevance')
+_WEIGHT_VEC = np.array([0.4, 0.4, 0.2], dtype=np.float32)
+
+# Stopwords ignored by the keyword-overlap fallback scorers
+_KEYWORD_STOPWORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'is', 'are'
+})
+_CONTENT_STOPWORDS = _KEYWORD_STOPWORDS | {'was', 'were'}
+
+# Punctuation stripped before splitting into words ('-' is kept for specs like 5W-30)
+_PUNCTUATION_TABLE = str.maketrans('', '', '.,;:!?()[]"\'')
+
+
+def _tokenize(text: str) -> set:
+    """Lowercase text, strip punctuation and split it into a set of words."""
+    return set(text.lower().translate(_PUNCTUATION_TABLE).split())
+
+
 class AnswerEvaluator:
     """Evaluates answer quality using multiple metrics."""
     
@@ -20,8 +53,21 @@ class AnswerEvaluator:
             embedding_model: SentenceTransformer model for semantic similarity
         """
         self.embedding_model = embedding_model
+        
+        # Text embedding cache (LRU, max 2048 texts)
+        self._embedding_cache = OrderedDict()
+        self._embedding_cache_size = 2048
+        
+        # Combined-context embedding cache keyed by the chunk tuple (LRU, max 64)
+        self._context_embedding_cache = OrderedDict()
+        self._context_cache_size = 64
+        
+        # Evaluation result cache (LRU, max 512 evaluations)
+        self._metrics_cache = OrderedDict()
+        self._metrics_cache_size = 512
     
-    def evaluate_answer(self, question: str, answer: str, context_chunks: List[str]) -> Dict:
+    def evaluate_answer(self, question: str, answer: str, context_chunks: List[str],
+                        context_embeddings: Optional[List[Optional[np.ndarray]]] = None) -> Dict:
         """
         Evaluate answer quality using multiple metrics.
         
@@ -29,33 +75,233 @@ class AnswerEvaluator:
             question: The user's question
             answer: The generated answer
             context_chunks: List of retrieved context chunks
+            context_embeddings: Optional precomputed embeddings aligned with
+                context_chunks (e.g. from the search index); None entries are
+                encoded as usual
             
         Returns:
             Dictionary with evaluation metrics
         """
+        # Nothing to score for empty or "not found" answers
+        if not answer.strip() or answer.startswith(NOT_FOUND_PREFIX):
+            return self.skipped_metrics()
+        
+        cache_key = self._metrics_cache_key(question, answer, context_chunks)
+        if cache_key in self._metrics_cache:
+            self._metrics_cache.move_to_end(cache_key)
+            return dict(self._metrics_cache[cache_key])
+        
+        if self.embedding_model is not None:
+            metrics = self._evaluate_with_embeddings(question, answer, context_chunks, context_embeddings)
+        else:
+            metrics = self._evaluate_with_overlap(question, answer, context_chunks)
+        
+        # 4. Overall quality score (weighted average)
+        metrics['overall_score'] = self._calculate_overall_score(metrics)
+        
+        self._metrics_cache[cache_key] = dict(metrics)
+        if len(self._metrics_cache) > self._metrics_cache_size:
+            self._metrics_cache.popitem(last=False)
+        
+        return metrics
+    
+    @staticmethod
+    def skipped_metrics() -> Dict:
+        """Metrics for an answer that was not evaluated (rendered as N/A)."""
+        return {
+            'answer_relevance': 0.0,
+            'faithfulness': 0.0,
+            'context_relevance': 0.0,
+            'overall_score': 0.0,
+            'skipped': True
+        }
+    
+    def _metrics_cache_key(self, question: str, answer: str, context_chunks: List[str]) -> str:
+        """Build a compact hash key for an evaluation input."""
+        payload = "\x00".join([question, answer, *context_chunks])
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _evaluate_with_overlap(self, question: str, answer: str, context_chunks: List[str]) -> Dict:
+        """
+        Compute all metrics with the keyword-overlap fallback scorers.
+        Each text is tokenized once and reused across metrics.
+        """
+        question_words = _tokenize(question) - _KEYWORD_STOPWORDS
+        
         metrics = {}
         
         # 1. Answer Relevance Score
-        metrics['answer_relevance'] = self.calculate_answer_relevance(question, answer)
+        metrics['answer_relevance'] = self._word_overlap(
+            question_words, _tokenize(answer) - _KEYWORD_STOPWORDS
+        )
         
         # 2. Faithfulness Score
-        metrics['faithfulness'] = self.calculate_faithfulness(answer, context_chunks)
+        if answer and context_chunks:
+            metrics['faithfulness'] = self._content_overlap_score(
+                answer, _tokenize(" ".join(context_chunks))
+            )
+        else:
+            metrics['faithfulness'] = 0.0
         
         # 3. Context Relevance (average)
         if context_chunks:
             context_relevances = [
-                self.calculate_answer_relevance(question, chunk) 
+                self._word_overlap(question_words, _tokenize(chunk) - _KEYWORD_STOPWORDS)
                 for chunk in context_chunks[:3]
             ]
-            metrics['context_relevance'] = np.mean(context_relevances)
+            metrics['context_relevance'] = float(np.mean(context_relevances))
         else:
             metrics['context_relevance'] = 0.0
         
-        # 4. Overall quality score (weighted average)
-        metrics['overall_score'] = self._calculate_overall_score(metrics)
+        return metrics
+    
+    def _evaluate_with_embeddings(self, question: str, answer: str, context_chunks: List[str],
+                                  context_embeddings: Optional[List[Optional[np.ndarray]]] = None) -> Dict:
+        """
+        Compute all embedding-based metrics from a single batched encode.
+        
+        Question, answer, answer sentences, combined context and the top
+        context chunks are embedded in one forward pass; every score is then
+        read off the resulting similarities. Top chunks that come with a
+        precomputed embedding are not re-encoded.
+        """
+        top_chunks = context_chunks[:3]
+        top_embeddings = list(context_embeddings[:3]) if context_embeddings is not None else []
+        top_embeddings += [None] * (len(top_chunks) - len(top_embeddings))
+        answer_sentences = self._split_sentences(answer) if answer and context_chunks else []
+        
+        chunks_to_encode = [
+            chunk for chunk, embedding in zip(top_chunks, top_embeddings) if embedding is None
+        ]
+        texts = [question, answer, *answer_sentences, *chunks_to_encode]
+        
+        # The combined context is the longest input; reuse its embedding when
+        # the same retrieval result is evaluated again
+        context_key = tuple(context_chunks)
+        context_embedding = self._get_context_embedding(context_key)
+        uncached_texts = []
+        if context_chunks and context_embedding is None:
+            uncached_texts.append(" ".join(context_chunks))
+        
+        try:
+            embeddings = self._embed_all(texts, uncached_texts)
+        except Exception as e:
+            print(f"Error calculating evaluation embeddings: {e}")
+            # Neutral scores on error
+            return {
+                'answer_relevance': 0.5,
+                'faithfulness': 0.5,
+                'context_relevance': 0.5 if context_chunks else 0.0
+            }
+        
+        if uncached_texts:
+            context_embedding = embeddings[len(texts)]
+            self._store_context_embedding(context_key, context_embedding)
+        
+        sentences_end = 2 + len(answer_sentences)
+        
+        # Embeddings are unit-length, so dot products are cosine similarities.
+        # Only two matrix-vector products are needed: question against every
+        # text, and answer sentences against the combined context.
+        # Normalize to 0-1 range (cosine similarity is -1 to 1)
+        question_scores = (embeddings[:len(texts)] @ embeddings[0] + 1) / 2
+        if answer_sentences:
+            sentence_scores = (embeddings[2:sentences_end] @ context_embedding + 1) / 2
+        
+        metrics = {}
+        
+        # 1. Answer Relevance: question vs answer
+        if question and answer:
+            metrics['answer_relevance'] = float(question_scores[1])
+        else:
+            metrics['answer_relevance'] = 0.0
+        
+        # 2. Faithfulness: each answer sentence vs combined context
+        if answer_sentences:
+            metrics['faithfulness'] = float(sentence_scores.mean())
+        else:
+            metrics['faithfulness'] = 0.0
+        
+        # 3. Context Relevance: question vs each top chunk
+        if top_chunks:
+            context_relevances = []
+            encoded_row = sentences_end
+            for chunk, embedding in zip(top_chunks, top_embeddings):
+                if embedding is None:
+                    score = question_scores[encoded_row]
+                    encoded_row += 1
+                else:
+                    # Stored vectors may be float16; re-normalize after upcasting
+                    embedding = np.asarray(embedding, dtype=np.float32)
+                    embedding = embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+                    score = (float(embedding @ embeddings[0]) + 1) / 2
+                context_relevances.append(score if question and chunk else 0.0)
+            metrics['context_relevance'] = float(np.mean(context_relevances))
+        else:
+            metrics['context_relevance'] = 0.0
         
         return metrics
     
+    def _embed_all(self, texts: List[str], uncached_texts: List[str] = ()) -> np.ndarray:
+        """
+        Embed a list of texts, reusing cached embeddings where possible.
+        Only texts not seen recently are sent to the model, in one batch.
+        
+        Args:
+            texts: Texts to embed through the text cache
+            uncached_texts: Extra texts encoded in the same batch but not cached
+        
+        Returns:
+            Array of L2-normalized embeddings: one row per text, followed by
+            one row per uncached text
+        """
+        keys = [text[:_MAX_CACHED_TEXT_LENGTH] for text in texts]
+        
+        # Encode only unique texts missing from the cache
+        missing = [key for key in dict.fromkeys(keys) if key not in self._embedding_cache]
+        extra_embeddings = []
+        if missing or uncached_texts:
+            encoded = self._encode(missing + list(uncached_texts))
+            for key, embedding in zip(missing, encoded):
+                self._embedding_cache[key] = embedding
+            extra_embeddings = list(encoded[len(missing):])
+        
+        embeddings = []
+        for key in keys:
+            self._embedding_cache.move_to_end(key)
+            embeddings.append(self._embedding_cache[key])
+        
+        # Evict least recently used entries once the cache is full
+        while len(self._embedding_cache) > self._embedding_cache_size:
+            self._embedding_cache.popitem(last=False)
+        
+        return np.stack(embeddings + extra_embeddings)
+    
+    def _get_context_embedding(self, context_key: Tuple[str, ...]):
+        """Return the cached combined-context embedding, or None."""
+        embedding = self._context_embedding_cache.get(context_key)
+        if embedding is not None:
+            self._context_embedding_cache.move_to_end(context_key)
+        return embedding
+    
+    def _store_context_embedding(self, context_key: Tuple[str, ...], embedding: np.ndarray):
+        """Cache a combined-context embedding, evicting the oldest if full."""
+        self._context_embedding_cache[context_key] = embedding
+        if len(self._context_embedding_cache) > self._context_cache_size:
+            self._context_embedding_cache.popitem(last=False)
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts with the embedding model in a single batched call."""
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        # Reduced-precision models may return float16 output
+        return np.asarray(embeddings, dtype=np.float32)
+    
     def calculate_answer_relevance(self, question: str, answer: str) -> float:
         """
         Calculate semantic similarity between question and answer.
@@ -76,13 +322,11 @@ class AnswerEvaluator:
             return self._keyword_overlap_score(question, answer)
         
         try:
-            # Generate embeddings
-            embeddings = self.embedding_model.encode([question, answer])
+            # Generate normalized embeddings
+            embeddings = self._embed_all([question, answer])
             
-            # Calculate cosine similarity
-            similarity = np.dot(embeddings[0], embeddings[1]) / (
-                np.linalg.norm(embeddings[0]) * np.linalg.norm(embeddings[1])
-            )
+            # Cosine similarity of unit vectors is their dot product
+            similarity = np.dot(embeddings[0], embeddings[1])
             
             # Normalize to 0-1 range (cosine similarity is -1 to 1)
             score = (similarity + 1) / 2
@@ -121,24 +365,24 @@ class AnswerEvaluator:
             if not answer_sentences:
                 return 0.0
             
-            # Check each sentence against context
-            faithfulness_scores = []
+            # Encode all sentences (and the context, unless cached) in one batch
+            context_key = tuple(context_chunks)
+            context_embedding = self._get_context_embedding(context_key)
+            if context_embedding is None:
+                embeddings = self._embed_all(answer_sentences, [combined_context])
+                context_embedding = embeddings[-1]
+                self._store_context_embedding(context_key, context_embedding)
+            else:
+                embeddings = self._embed_all(answer_sentences)
+            
+            # Similarity of every sentence to the context in one GEMV
+            similarities = embeddings[:len(answer_sentences)] @ context_embedding
             
-            for sentence in answer_sentences:
-                # Encode sentence and context
-                embeddings = self.embedding_model.encode([sentence, combined_context])
-                
-                # Calculate similarity
-                similarity = np.dot(embeddings[0], embeddings[1]) / (
-                    np.linalg.norm(embeddings[0]) * np.linalg.norm(embeddings[1])
-                )
-                
-                # Normalize to 0-1
-                score = (similarity + 1) / 2
-                faithfulness_scores.append(score)
+            # Normalize to 0-1
+            faithfulness_scores = (similarities + 1) / 2
             
             # Return average faithfulness across all sentences
-            return float(np.mean(faithfulness_scores))
+            return float(faithfulness_scores.mean())
         
         except Exception as e:
             print(f"Error calculating faithfulness: {e}")
@@ -153,57 +397,51 @@ class AnswerEvaluator:
         - Faithfulness: 40% (equally important - no hallucinations)
         - Context Relevance: 20% (supporting factor)
         """
-        weights = {
-            'answer_relevance': 0.4,
-            'faithfulness': 0.4,
-            'context_relevance': 0.2
-        }
-        
-        score = (
-            metrics.get('answer_relevance', 0) * weights['answer_relevance'] +
-            metrics.get('faithfulness', 0) * weights['faithfulness'] +
-            metrics.get('context_relevance', 0) * weights['context_relevance']
+        values = np.fromiter(
+            (metrics.get(key, 0.0) for key in _WEIGHT_KEYS),
+            dtype=np.float32,
+            count=len(_WEIGHT_KEYS)
         )
-        
-        return float(score)
+        return float(values @ _WEIGHT_VEC)
     
     def _keyword_overlap_score(self, text1: str, text2: str) -> float:
         """Fallback: simple keyword overlap score."""
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        
-        # Remove common stopwords
-        stopwords = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'is', 'are'}
-        words1 = words1 - stopwords
-        words2 = words2 - stopwords
-        
+        return self._word_overlap(
+            _tokenize(text1) - _KEYWORD_STOPWORDS,
+            _tokenize(text2) - _KEYWORD_STOPWORDS
+        )
+    
+    @staticmethod
+    def _word_overlap(words1: AbstractSet[str], words2: AbstractSet[str]) -> float:
+        """Overlap of two stopword-free word sets, relative to the larger set."""
         if not words1 or not words2:
             return 0.0
         
-        overlap = len(words1.intersection(words2))
+        overlap = len(words1 & words2)
         return overlap / max(len(words1), len(words2))
     
-    def _content_overlap_score(self, answer: str, context: str) -> float:
-        """Check what percentage of answer content appears in context."""
-        answer_words = set(answer.lower().split())
-        context_words = set(context.lower().split())
+    def _content_overlap_score(self, answer: str, context: Union[str, AbstractSet[str]]) -> float:
+        """
+        Check what percentage of answer content appears in context.
         
-        # Remove stopwords
-        stopwords = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'is', 'are', 'was', 'were'}
-        answer_words = answer_words - stopwords
+        Args:
+            answer: The generated answer
+            context: Context text, or its already tokenized word set
+        """
+        answer_words = _tokenize(answer) - _CONTENT_STOPWORDS
+        context_words = _tokenize(context) if isinstance(context, str) else context
         
         if not answer_words:
             return 0.0
         
         # How many answer words appear in context?
-        overlap = len(answer_words.intersection(context_words))
+        overlap = len(answer_words & context_words)
         return overlap / len(answer_words)
     
     def _split_sentences(self, text: str) -> List[str]:
         """Simple sentence splitter."""
-        import re
-        sentences = re.split(r'[.!?]+', text)
-        return [s.strip() for s in sentences if s.strip()]
+        sentences = (match.group(0).strip() for match in _SENTENCE_RE.finditer(text))
+        return [s for s in sentences if s]
     
     def get_quality_rating(self, score: float) -> Tuple[str, str]:
         """
@@ -226,14 +464,11 @@ def track_response_time(func):
     """
     Decorator to track response time of a function.
     Adds 'response_time' to the returned dictionary.
+    Works for both regular functions and coroutine functions.
     """
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        
-        response_time = end_time - start_time
+    def add_response_time(result, start_ns):
+        # Monotonic, high-resolution clock; reported in seconds
+        response_time = (time.perf_counter_ns() - start_ns) / 1e9
         
         # Add response time to result if it's a dictionary
         if isinstance(result, dict):
@@ -241,5 +476,17 @@ def track_response_time(func):
         
         return result
     
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start_ns = time.perf_counter_ns()
+            return add_response_time(await func(*args, **kwargs), start_ns)
+        
+        return async_wrapper
+    
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start_ns = time.perf_counter_ns()
+        return add_response_time(func(*args, **kwargs), start_ns)
+    
     return wrapper
-
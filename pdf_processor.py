@@ -5,9 +5,44 @@ Extracts text from car manuals and stores them in a structured format.
 
 import pdfplumber
 import os
-from typing import Dict, List, Tuple
+import re
+import mmap
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 import json
 
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib json parser
+    orjson = None
+
+_TOKEN_RE = re.compile(r'\S+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Words that identify each car model in a question
+CAR_MODEL_KEYWORDS = {
+    "MG Astor": ["astor", "mg astor", "mg"],
+    "Tata Tiago": ["tiago", "tata tiago", "tata"],
+}
+
+# One alternation with a named group per model, so a single scan finds the model
+_CAR_MODEL_GROUPS = {f"model{i}": model for i, model in enumerate(CAR_MODEL_KEYWORDS)}
+_CAR_MODEL_RE = re.compile(
+    "|".join(
+        rf"\b(?P<{group}>" + "|".join(
+            re.escape(keyword) for keyword in sorted(CAR_MODEL_KEYWORDS[model], key=len, reverse=True)
+        ) + r")\b"
+        for group, model in _CAR_MODEL_GROUPS.items()
+    ),
+    re.IGNORECASE
+)
+
+# Pages handed to each extraction worker, and the page count below which
+# extraction stays in-process (pool startup would cost more than it saves)
+_PAGES_PER_TASK = 16
+_MAX_EXTRACT_WORKERS = 4
+
 
 class PDFProcessor:
     """Processes PDF manuals and extracts text content."""
@@ -17,31 +52,53 @@ class PDFProcessor:
         self.manuals_data = {}
         
     def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract all text from a PDF file."""
+        """
+        Extract all text from a PDF file.
+        Page ranges are extracted in parallel worker processes for large PDFs.
+        """
         text = ""
         try:
             with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
+                num_pages = len(pdf.pages)
+            
+            ranges = [
+                (pdf_path, start, min(start + _PAGES_PER_TASK, num_pages))
+                for start in range(0, num_pages, _PAGES_PER_TASK)
+            ]
+            
+            if len(ranges) <= 1:
+                return "".join(_extract_page_range(args) for args in ranges)
+            
+            max_workers = min(os.cpu_count() or 1, _MAX_EXTRACT_WORKERS, len(ranges))
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                # map preserves range order, so pages are joined in sequence
+                text = "".join(executor.map(_extract_page_range, ranges))
         except Exception as e:
             print(f"Error extracting text from {pdf_path}: {e}")
         return text
     
     def chunk_text(self, text: str, chunk_size: int = 200, overlap: int = 50) -> List[Dict]:
-        """Split text into chunks with metadata. Smaller chunks for better semantic search."""
+        """
+        Split text into chunks with metadata. Smaller chunks for better semantic search.
+        Whitespace is collapsed and word boundaries are located once, so each
+        chunk is a single slice equal to its words joined by single spaces.
+        """
         chunks = []
-        words = text.split()
+        text = _WHITESPACE_RE.sub(" ", text)
+        starts = array('i')
+        ends = array('i')
+        for match in _TOKEN_RE.finditer(text):
+            starts.append(match.start())
+            ends.append(match.end())
+        num_words = len(starts)
         
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk_words = words[i:i + chunk_size]
-            chunk_text = " ".join(chunk_words)
+        for i in range(0, num_words, chunk_size - overlap):
+            end_word = min(i + chunk_size, num_words)
             
             chunks.append({
-                "text": chunk_text,
+                "text": text[starts[i]:ends[end_word - 1]],
                 "start_word": i,
-                "end_word": min(i + chunk_size, len(words))
+                "end_word": end_word
             })
         
         return chunks
@@ -69,25 +126,25 @@ class PDFProcessor:
         return manual_data
     
     def save_processed_data(self, output_path: str = "processed_manuals.json"):
-        """Save processed manual data to JSON file."""
-        # Remove full_text to save space, keep only chunks
-        save_data = {}
-        for model, data in self.manuals_data.items():
-            save_data[model] = {
-                "car_model": data["car_model"],
-                "chunks": data["chunks"],
-                "total_chunks": data["total_chunks"]
-            }
-        
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(save_data, f, indent=2, ensure_ascii=False)
+        """
+        Save processed manual data as NDJSON.
+        Each manual is written as a header line {"car_model", "total_chunks"}
+        followed by one line per chunk, streamed without building a copy.
+        """
+        with open(output_path, "wb") as f:
+            for model, data in self.manuals_data.items():
+                header = {"car_model": data["car_model"], "total_chunks": data["total_chunks"]}
+                f.write(_json_line(header))
+                for chunk in data["chunks"]:
+                    f.write(_json_line(chunk))
         print(f"Saved processed data to {output_path}")
     
     def load_processed_data(self, input_path: str = "processed_manuals.json") -> Dict:
-        """Load processed manual data from JSON file."""
+        """Load processed manual data (NDJSON, or the older single JSON document)."""
         if os.path.exists(input_path):
-            with open(input_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = _load_ndjson_manuals(input_path)
+            if data is None:
+                data = _load_json_file(input_path)
             self.manuals_data = data
             return data
         return {}
@@ -97,18 +154,81 @@ class PDFProcessor:
         return list(self.manuals_data.keys())
 
 
-def detect_car_model(question: str) -> str:
-    """Detect which car model the question is about."""
-    question_lower = question.lower()
-    
-    # Check for MG Astor
-    astor_keywords = ["astor", "mg astor", "mg"]
-    if any(keyword in question_lower for keyword in astor_keywords):
-        return "MG Astor"
-    
-    # Check for Tata Tiago
-    tiago_keywords = ["tiago", "tata tiago", "tata"]
-    if any(keyword in question_lower for keyword in tiago_keywords):
-        return "Tata Tiago"
+def _extract_page_range(args: Tuple[str, int, int]) -> str:
+    """
+    Extract text from pages [start, end) of a PDF.
+    Runs in a worker process; the PDF is opened by path so no pdfplumber
+    objects are pickled, and once per range rather than once per page.
+    """
+    pdf_path, start, end = args
+    parts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[start:end]:
+            page_text = page.extract_text()
+            if page_text:
+                parts.append(page_text)
+    # Each page ends with a newline so ranges can be concatenated directly
+    return "\n".join(parts) + "\n" if parts else ""
+
+
+def _json_line(obj) -> bytes:
+    """Serialize one value as a UTF-8 JSON line, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _parse_json(line: bytes):
+    """Parse one JSON value, using orjson when available."""
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def _load_ndjson_manuals(path: str) -> Optional[Dict]:
+    """
+    Read manuals saved by save_processed_data line by line.
     
-    return None
+    Returns:
+        Manual data keyed by car model, or None if the file is not in the
+        NDJSON layout (e.g. a legacy pretty-printed JSON document)
+    """
+    manuals_data = {}
+    with open(path, "rb") as f:
+        first_line = f.readline()
+        try:
+            header = _parse_json(first_line)
+        except ValueError:
+            return None
+        # A legacy single-line document maps model names to manual dicts
+        if not isinstance(header, dict) or "total_chunks" not in header or isinstance(header.get("car_model"), dict):
+            return None
+        
+        while header is not None:
+            chunks = [_parse_json(f.readline()) for _ in range(header["total_chunks"])]
+            manuals_data[header["car_model"]] = {
+                "car_model": header["car_model"],
+                "chunks": chunks,
+                "total_chunks": header["total_chunks"]
+            }
+            line = f.readline()
+            header = _parse_json(line) if line.strip() else None
+    return manuals_data
+
+
+def _load_json_file(path: str):
+    """
+    Parse a JSON file by memory-mapping it, using orjson when available.
+    Mapping avoids reading the whole file into a Python bytes object first.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if orjson is not None:
+                return orjson.loads(memoryview(mm))
+            return json.loads(mm[:])
+
+
+def detect_car_model(question: str) -> str:
+    """Detect which car model the question is about (the first one mentioned)."""
+    match = _CAR_MODEL_RE.search(question)
+    return _CAR_MODEL_GROUPS[match.lastgroup] if match else None
@@ -7,6 +7,15 @@ from typing import List, Dict
 import re
 
 
+# Question words ignored when matching keywords against the context
+_STOPWORDS = frozenset({
+    "how", "to", "what", "which", "where", "when", "why", "is", "are", "the", "a", "an"
+})
+_SENT_SPLIT = re.compile(r'[.!?]\s+')
+_WORD_RE = re.compile(r'\b\w+\b')
+_WS_RE = re.compile(r'\s+')
+
+
 class QASystem:
     """Simple Q&A system that generates answers from retrieved chunks."""
     
@@ -47,28 +56,16 @@ class QASystem:
         question_lower = question.lower()
         
         # Try to find direct sentences that might answer the question
-        sentences = re.split(r'[.!?]\s+', context)
+        sentences = _SENT_SPLIT.split(context)
         relevant_sentences = []
         
         # Extract keywords from question
-        question_keywords = set(re.findall(r'\b\w+\b', question_lower))
-        question_keywords.discard('how')
-        question_keywords.discard('to')
-        question_keywords.discard('what')
-        question_keywords.discard('which')
-        question_keywords.discard('where')
-        question_keywords.discard('when')
-        question_keywords.discard('why')
-        question_keywords.discard('is')
-        question_keywords.discard('are')
-        question_keywords.discard('the')
-        question_keywords.discard('a')
-        question_keywords.discard('an')
+        question_keywords = set(_WORD_RE.findall(question_lower)) - _STOPWORDS
         
-        # Score sentences by keyword matches
+        # Score sentences by the number of question keywords they contain
         for sentence in sentences:
-            sentence_lower = sentence.lower()
-            score = sum(1 for keyword in question_keywords if keyword in sentence_lower)
+            tokens = set(_WORD_RE.findall(sentence.lower()))
+            score = len(tokens & question_keywords)
             if score > 0:
                 relevant_sentences.append((score, sentence.strip()))
         
@@ -81,7 +78,7 @@ class QASystem:
             answer = " ".join(answer_sentences)
             
             # Clean up the answer
-            answer = re.sub(r'\s+', ' ', answer).strip()
+            answer = _WS_RE.sub(' ', answer).strip()
             
             # If answer is too short, use more context
             if len(answer) < 50:
@@ -5,27 +5,70 @@ Uses Retrieval-Augmented Generation with LLMs for better answers.
 
 from typing import List, Dict, Optional
 import os
+import re
+import asyncio
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from contextlib import closing
 from dotenv import load_dotenv
 from evaluation import AnswerEvaluator, track_response_time
 
 load_dotenv()
 
+# OpenAI prompt; {car_model} is filled in once per model, {context} and {question} per request
+_OPENAI_PROMPT_TEMPLATE = """You are an expert car manual assistant. Answer the user's question based on the provided manual excerpts from the {car_model} owner's manual.
+
+MANUAL EXCERPTS:
+{context}
+
+USER QUESTION: {question}
+
+INSTRUCTIONS:
+1. Answer directly and clearly based on the provided manual excerpts
+2. ONLY say you couldn't find information if the excerpts contain NO relevant information at all
+3. If you found ANY relevant information in the excerpts, provide it without disclaimers
+4. Include specific steps, numbers, or measurements when mentioned in the manual
+5. Use bullet points for step-by-step instructions when appropriate
+6. Be helpful and clear, as if explaining to a car owner
+7. Do NOT add phrases like "I couldn't find" if you just provided useful information
+
+ANSWER:"""
+
+_OLLAMA_PROMPT_TEMPLATE = """Answer this question about car manuals based on the provided context:
+
+Context:
+{context}
+
+Question: {question}
+
+Answer based only on the context provided. Be concise and clear."""
+
 
 class RAGQASystem:
     """RAG-based Q&A system using LLMs."""
     
-    def __init__(self, use_llm: bool = True, embedding_model=None):
+    def __init__(self, use_llm: bool = True, embedding_model=None, cache_dir: Optional[str] = "cache"):
         """
         Initialize RAG Q&A system.
         
         Args:
             use_llm: Whether to use LLM (requires API key) or fallback to simple extraction
             embedding_model: SentenceTransformer model for evaluation (optional)
+            cache_dir: Directory for the persistent LLM answer cache (None keeps it in memory only)
         """
         self.use_llm = use_llm
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         
+        # LLM answers keyed by provider, question and retrieved chunks (LRU, max 512)
+        self._answer_cache = OrderedDict()
+        self._answer_cache_size = 512
+        self._answer_cache_path = os.path.join(cache_dir, "llm_cache.sqlite") if cache_dir else None
+        
+        # OpenAI prompt templates specialized per car model
+        self._prompt_templates = {}
+        
         # Initialize evaluator
         self.evaluator = AnswerEvaluator(embedding_model=embedding_model)
         
@@ -54,24 +97,33 @@ class RAGQASystem:
                     self.use_llm = False
                     print("⚠️ No LLM available, using simple extraction")
     
-    @track_response_time
     def generate_answer(self, question: str, search_results: List[Dict]) -> Dict:
-        """Generate an answer using RAG with quality metrics."""
+        """
+        Generate an answer using RAG with quality metrics.
+        Blocking wrapper around agenerate_answer; call that directly from async code.
+        """
+        return asyncio.run(self.agenerate_answer(question, search_results))
+    
+    @track_response_time
+    async def agenerate_answer(self, question: str, search_results: List[Dict]) -> Dict:
+        """
+        Generate an answer using RAG with quality metrics.
+        The LLM call runs in a worker thread while confidence is calculated,
+        so the event loop stays free for other queries.
+        """
         if not search_results:
             return {
                 "answer": "I couldn't find relevant information in the manual to answer your question.",
                 "citations": [],
                 "confidence": "low",
-                "metrics": {
-                    "answer_relevance": 0.0,
-                    "faithfulness": 0.0,
-                    "context_relevance": 0.0,
-                    "overall_score": 0.0
-                }
+                "metrics": self.evaluator.skipped_metrics()
             }
         
-        # Calculate confidence based on search result quality
-        confidence = self._calculate_confidence(search_results)
+        # Generate the answer and calculate confidence based on search result quality concurrently
+        answer, confidence = await asyncio.gather(
+            self._agenerate_text(question, search_results),
+            asyncio.to_thread(self._calculate_confidence, search_results)
+        )
         
         # Format citations
         citations = []
@@ -82,17 +134,17 @@ class RAGQASystem:
                 "excerpt": result["text"][:300] + "..." if len(result["text"]) > 300 else result["text"]
             })
         
-        # Use LLM if available, otherwise fallback
-        if self.use_llm and self.llm_provider == "openai":
-            answer = self._generate_with_openai(question, search_results)
-        elif self.use_llm and self.llm_provider == "ollama":
-            answer = self._generate_with_ollama(question, search_results)
+        # Evaluate answer quality (a low-confidence extraction carries no
+        # hallucination risk and is already flagged, so skip the embedding work)
+        if not self.use_llm and confidence == "low":
+            metrics = self.evaluator.skipped_metrics()
         else:
-            answer = self._simple_extraction(question, search_results)
-        
-        # Evaluate answer quality
-        context_chunks = [result["text"] for result in search_results[:5]]
-        metrics = self.evaluator.evaluate_answer(question, answer, context_chunks)
+            context_chunks = [result["text"] for result in search_results[:5]]
+            # Reuse chunk vectors from the search index instead of re-encoding them
+            context_embeddings = [result.get("embedding") for result in search_results[:5]]
+            metrics = await asyncio.to_thread(
+                self.evaluator.evaluate_answer, question, answer, context_chunks, context_embeddings
+            )
         
         return {
             "answer": answer,
@@ -101,6 +153,85 @@ class RAGQASystem:
             "metrics": metrics
         }
     
+    async def _agenerate_text(self, question: str, search_results: List[Dict]) -> str:
+        """
+        Generate the answer text with the configured LLM in a worker thread.
+        Answers for a question over the same retrieved chunks are served from
+        cache; the cache lookup runs in the same worker thread as the LLM call.
+        """
+        # Use LLM if available, otherwise fallback
+        if self.use_llm and self.llm_provider == "openai":
+            generate = self._generate_with_openai
+        elif self.use_llm and self.llm_provider == "ollama":
+            generate = self._generate_with_ollama
+        else:
+            return self._simple_extraction(question, search_results)
+        
+        answer = await asyncio.to_thread(self._generate_cached, generate, question, search_results)
+        if answer is None:
+            return self._simple_extraction(question, search_results)
+        return answer
+    
+    def _generate_cached(self, generate, question: str, search_results: List[Dict]) -> Optional[str]:
+        """Return the cached answer, or generate and cache one. Returns None if generation fails."""
+        cache_key = self._answer_cache_key(question, search_results)
+        answer = self._get_cached_answer(cache_key)
+        if answer is not None:
+            return answer
+        
+        answer = generate(question, search_results)
+        if answer is not None:
+            self._store_answer(cache_key, answer)
+        return answer
+    
+    def _answer_cache_key(self, question: str, search_results: List[Dict]) -> str:
+        """Build a hash key from the provider, normalized question and prompt chunks."""
+        normalized_question = re.sub(r'\s+', ' ', question.strip().lower())
+        # Chunk text is included so answers are not reused after a manual changes
+        parts = [self.llm_provider, normalized_question]
+        for result in search_results[:5]:
+            parts.append(f"{result['car_model']}\x1f{result.get('chunk_index')}\x1f{result['text']}")
+        return hashlib.blake2b("\x00".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _get_cached_answer(self, cache_key: str) -> Optional[str]:
+        """Look up an answer in memory, then in the on-disk cache."""
+        if cache_key in self._answer_cache:
+            self._answer_cache.move_to_end(cache_key)
+            return self._answer_cache[cache_key]
+        
+        if self._answer_cache_path is None or not os.path.exists(self._answer_cache_path):
+            return None
+        try:
+            with closing(sqlite3.connect(self._answer_cache_path)) as conn:
+                row = conn.execute("SELECT answer FROM answers WHERE key = ?", (cache_key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not read LLM answer cache: {e}")
+            return None
+        if row is None:
+            return None
+        self._remember_answer(cache_key, row[0])
+        return row[0]
+    
+    def _store_answer(self, cache_key: str, answer: str):
+        """Cache an answer in memory and on disk."""
+        self._remember_answer(cache_key, answer)
+        if self._answer_cache_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._answer_cache_path) or ".", exist_ok=True)
+            # closing() closes the connection; the inner block commits
+            with closing(sqlite3.connect(self._answer_cache_path)) as conn, conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT NOT NULL)")
+                conn.execute("INSERT OR REPLACE INTO answers (key, answer) VALUES (?, ?)", (cache_key, answer))
+        except sqlite3.Error as e:
+            print(f"Warning: Could not write LLM answer cache: {e}")
+    
+    def _remember_answer(self, cache_key: str, answer: str):
+        """Add an answer to the in-memory LRU, evicting the oldest if full."""
+        self._answer_cache[cache_key] = answer
+        if len(self._answer_cache) > self._answer_cache_size:
+            self._answer_cache.popitem(last=False)
+    
     def _calculate_confidence(self, search_results: List[Dict]) -> str:
         """Calculate confidence level based on search result quality."""
         if not search_results:
@@ -123,8 +254,16 @@ class RAGQASystem:
         
         return "low"
     
-    def _generate_with_openai(self, question: str, search_results: List[Dict]) -> str:
-        """Generate answer using OpenAI API."""
+    def _openai_prompt_template(self, car_model: str) -> str:
+        """Return the OpenAI prompt template with the car model filled in."""
+        template = self._prompt_templates.get(car_model)
+        if template is None:
+            template = _OPENAI_PROMPT_TEMPLATE.replace("{car_model}", car_model)
+            self._prompt_templates[car_model] = template
+        return template
+    
+    def _generate_with_openai(self, question: str, search_results: List[Dict]) -> Optional[str]:
+        """Generate answer using OpenAI API. Returns None if the call fails."""
         try:
             # Prepare context from top results
             context_chunks = []
@@ -133,25 +272,9 @@ class RAGQASystem:
             
             context = "\n".join(context_chunks)
             
-            # Create improved prompt
+            # Fill in the prompt template for this car model
             car_model = search_results[0]["car_model"] if search_results else "the car"
-            prompt = f"""You are an expert car manual assistant. Answer the user's question based on the provided manual excerpts from the {car_model} owner's manual.
-
-MANUAL EXCERPTS:
-{context}
-
-USER QUESTION: {question}
-
-INSTRUCTIONS:
-1. Answer directly and clearly based on the provided manual excerpts
-2. ONLY say you couldn't find information if the excerpts contain NO relevant information at all
-3. If you found ANY relevant information in the excerpts, provide it without disclaimers
-4. Include specific steps, numbers, or measurements when mentioned in the manual
-5. Use bullet points for step-by-step instructions when appropriate
-6. Be helpful and clear, as if explaining to a car owner
-7. Do NOT add phrases like "I couldn't find" if you just provided useful information
-
-ANSWER:"""
+            prompt = self._openai_prompt_template(car_model).format(context=context, question=question)
             
             # Call OpenAI
             response = self.client.chat.completions.create(
@@ -168,10 +291,10 @@ ANSWER:"""
             
         except Exception as e:
             print(f"Error with OpenAI: {e}")
-            return self._simple_extraction(question, search_results)
+            return None
     
-    def _generate_with_ollama(self, question: str, search_results: List[Dict]) -> str:
-        """Generate answer using Ollama (local LLM)."""
+    def _generate_with_ollama(self, question: str, search_results: List[Dict]) -> Optional[str]:
+        """Generate answer using Ollama (local LLM). Returns None if the call fails."""
         try:
             import requests
             
@@ -182,14 +305,7 @@ ANSWER:"""
             
             context = "\n".join(context_chunks)
             
-            prompt = f"""Answer this question about car manuals based on the provided context:
-
-Context:
-{context}
-
-Question: {question}
-
-Answer based only on the context provided. Be concise and clear."""
+            prompt = _OLLAMA_PROMPT_TEMPLATE.format(context=context, question=question)
 
             # Call Ollama
             response = requests.post(
@@ -205,11 +321,11 @@ Answer based only on the context provided. Be concise and clear."""
             if response.status_code == 200:
                 return response.json().get("response", "").strip()
             else:
-                return self._simple_extraction(question, search_results)
+                return None
                 
         except Exception as e:
             print(f"Error with Ollama: {e}")
-            return self._simple_extraction(question, search_results)
+            return None
     
     def _simple_extraction(self, question: str, search_results: List[Dict]) -> str:
         """Fallback simple extraction method."""
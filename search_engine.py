@@ -5,135 +5,1333 @@ Performance optimized with persistent indexes, lazy loading, and caching.
 """
 
 import os
+import re
 import json
+import logging
+import mmap
+import hashlib
 import numpy as np
-from typing import List, Dict, Tuple, Optional
-from sentence_transformers import SentenceTransformer
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional, TYPE_CHECKING
 import faiss
+from embedding_batcher import EmbeddingBatcher, _inference_mode
+
+# Let FAISS spread batched searches over every core unless OpenMP is configured
+if "OMP_NUM_THREADS" not in os.environ:
+    faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib json module
+    orjson = None
+
+try:
+    import numba
+except ImportError:  # Optional: keyword scoring falls back to numpy
+    numba = None
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    # Imported lazily at runtime: it pulls in torch and transformers
+    from sentence_transformers import SentenceTransformer
+
+__all__ = [
+    "DEFAULT_MODEL_NAME",
+    "ManualSearchEngine",
+    "ChunkEmbeddingCache",
+    "ChunkTextStore",
+    "ChunkMetadata",
+    "chunk_cache_key",
+    "load_embedding_model",
+    "compile_embedding_model",
+    "quantize_embedding_model",
+]
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Index layout by corpus size: exact flat scan below FLAT_MAX_VECTORS, an
+# HNSW graph up to IVF_MIN_VECTORS, and an inverted file above that
+FLAT_MAX_VECTORS = 1000
+IVF_MIN_VECTORS = 100000
+
+# HNSW graph parameters (neighbours per node, build-time and minimum query-time beam width)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_MIN_EF_SEARCH = 64
+
+# IVF training points per list (FAISS warns below 39) and lists probed per query
+IVF_TRAIN_POINTS_PER_LIST = 39
+IVF_NPROBE = 16
+
+# Chunks embedded and added to the index per step while building, and
+# texts per forward pass of the embedding model
+EMBED_BATCH_SIZE = 1024
+ENCODE_BATCH_SIZE = 64
+
+# Candidates fetched per requested result from a quantized index before exact reranking
+QUANTIZED_OVERSAMPLE = 4
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+# Models loaded by engines that were not given one, by (model name, role)
+_model_cache: Dict[Tuple[str, str], "SentenceTransformer"] = {}
+
+
+def load_embedding_model(model_name: str = DEFAULT_MODEL_NAME, device: Optional[str] = None) -> "SentenceTransformer":
+    """
+    Load a sentence transformer model on the best available device.
+    
+    Args:
+        model_name: Sentence transformer model name
+        device: Torch device to load onto (CUDA if available when None)
+        
+    Returns:
+        Loaded SentenceTransformer model
+    """
+    logger.info("Loading sentence transformer model: %s...", model_name)
+    import torch
+    from sentence_transformers import SentenceTransformer
+    if device is None:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    model = SentenceTransformer(model_name, device=device)
+    # Ensure model is on correct device, in inference (no dropout) mode
+    model.to(device)
+    model.eval()
+    return model
+
+
+def compile_embedding_model(model: "SentenceTransformer") -> "SentenceTransformer":
+    """
+    JIT-compile the transformer inside a SentenceTransformer with torch.compile.
+    Falls back to the eager module if compilation is unavailable or fails.
+    
+    Args:
+        model: Loaded SentenceTransformer model
+        
+    Returns:
+        The same model with its transformer module compiled
+    """
+    import torch
+    if not hasattr(torch, "compile"):
+        return model
+    
+    transformer = model[0]
+    # Older sentence-transformers register the HF model as `auto_model`,
+    # newer versions as `model` (with a read-only `auto_model` property)
+    attr = "auto_model" if "auto_model" in transformer._modules else "model"
+    eager_module = getattr(transformer, attr)
+    try:
+        setattr(transformer, attr, torch.compile(eager_module, mode="reduce-overhead", dynamic=True))
+        # Warm up twice so the first real query doesn't pay the compile cost
+        for _ in range(2):
+            model.encode(["warmup"] * 2, show_progress_bar=False)
+        logger.info("Embedding model compiled with torch.compile")
+    except Exception as e:
+        logger.warning("torch.compile failed, using eager model: %s", e)
+        setattr(transformer, attr, eager_module)
+    return model
+
+
+# Sample texts used to check that a lower-precision model still agrees with the original
+_PRECISION_PROBE_TEXTS = [
+    "How to turn on the indicator?",
+    "The recommended engine oil is SAE 5W-30.",
+    "Check the tire pressure when the tires are cold."
+]
+_MAX_PRECISION_DRIFT = 0.01
+
+
+def quantize_embedding_model(model: "SentenceTransformer", precision: str = "int8") -> "SentenceTransformer":
+    """
+    Convert a SentenceTransformer to a lower precision for faster inference.
+    
+    Supported precisions are "int8" (dynamic quantization of linear layers,
+    CPU only), "float16" (GPU only) and "bfloat16". The converted model is
+    checked against the original on a few probe sentences; if cosine drift
+    exceeds 0.01 it falls back to bfloat16, and then to the original model.
+    
+    Args:
+        model: Loaded SentenceTransformer model
+        precision: Target precision
+        
+    Returns:
+        Converted model, or the original model if conversion is not suitable
+    """
+    import copy
+    import torch
+    
+    device = model.device.type
+    if precision == "int8" and device != "cpu":
+        logger.warning("int8 quantization is CPU only, using float16 instead")
+        precision = "float16"
+    if precision == "float16" and device == "cpu":
+        logger.warning("float16 is not efficient on CPU, using bfloat16 instead")
+        precision = "bfloat16"
+    
+    try:
+        if precision == "int8":
+            candidate = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif precision == "float16":
+            candidate = copy.deepcopy(model).half()
+        elif precision == "bfloat16":
+            candidate = copy.deepcopy(model).to(dtype=torch.bfloat16)
+        else:
+            return model
+        
+        reference = model.encode(_PRECISION_PROBE_TEXTS, convert_to_numpy=True,
+                                 normalize_embeddings=True, show_progress_bar=False)
+        converted = candidate.encode(_PRECISION_PROBE_TEXTS, convert_to_numpy=True,
+                                     normalize_embeddings=True, show_progress_bar=False)
+        drift = 1.0 - float(np.min(np.sum(reference * converted.astype(np.float32), axis=1)))
+    except Exception as e:
+        logger.warning("%s conversion failed, using float32 model: %s", precision, e)
+        return model
+    
+    if drift > _MAX_PRECISION_DRIFT:
+        if precision != "bfloat16":
+            logger.warning("%s drift %.4f too high, trying bfloat16", precision, drift)
+            return quantize_embedding_model(model, "bfloat16")
+        logger.warning("%s drift %.4f too high, using float32 model", precision, drift)
+        return model
+    
+    logger.info("Embedding model converted to %s (drift %.4f)", precision, drift)
+    return candidate
+
+
+def _model_precision(model) -> str:
+    """Device and numeric precision a model encodes with, e.g. "cpu/int8" or "cuda/float16"."""
+    device = model.device.type
+    modules = list(model.modules()) if hasattr(model, "modules") else []
+    if any(".quantized" in type(module).__module__ for module in modules):
+        return f"{device}/int8"
+    parameter = next(model.parameters(), None) if hasattr(model, "parameters") else None
+    dtype = str(parameter.dtype).replace("torch.", "") if parameter is not None else "float32"
+    return f"{device}/{dtype}"
+
+
+def _read_json(path: str):
+    """Read a JSON file, using orjson when available."""
+    with open(path, "rb") as f:
+        return orjson.loads(f.read()) if orjson is not None else json.load(f)
+
+
+def _write_json(path: str, obj):
+    """Write a compact JSON file, using orjson when available."""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f)
+
+
+def _is_quantized(index) -> bool:
+    """Whether a FAISS index stores lossy 8-bit scalar-quantized vectors."""
+    storage = faiss.downcast_index(index.storage) if hasattr(index, "storage") else index
+    if not isinstance(storage, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return False
+    # Chunk embeddings are rounded to float16 before indexing, so fp16 storage is exact
+    return storage.sq.qtype != faiss.ScalarQuantizer.QT_fp16
+
+
+def _read_index_mmap(path: str):
+    """
+    Read a FAISS index with its vectors memory-mapped instead of loaded.
+    
+    The mapped index is read-only; it falls back to a regular read if this
+    FAISS build cannot map the file.
+    """
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    try:
+        return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY), True
+    except RuntimeError:
+        return faiss.read_index(path), False
+
+
+def _file_sha256(path: str) -> str:
+    """Hex SHA-256 digest of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_stamp(path: str) -> str:
+    """Size and modification time of a file, as "size mtime_ns"."""
+    stat = os.stat(path)
+    return f"{stat.st_size} {stat.st_mtime_ns}"
+
+
+def _score_postings(posting_ids: np.ndarray, posting_offsets: np.ndarray,
+                    term_ids: np.ndarray, num_chunks: int) -> np.ndarray:
+    """
+    Count, for every chunk, how many of the given terms it contains.
+    
+    Args:
+        posting_ids: Chunk ids of all posting lists, concatenated
+        posting_offsets: Start of each term's posting list in posting_ids, plus an end marker
+        term_ids: Distinct query term ids
+        num_chunks: Number of chunks
+        
+    Returns:
+        int32 array of match counts, one per chunk
+    """
+    if numba is not None:
+        scores = np.zeros(num_chunks, dtype=np.int32)
+        _accumulate_postings(scores, posting_ids, posting_offsets, term_ids)
+        return scores
+    matches = np.concatenate([posting_ids[posting_offsets[t]:posting_offsets[t + 1]] for t in term_ids])
+    return np.bincount(matches, minlength=num_chunks).astype(np.int32)
+
+
+if numba is not None:
+    @numba.njit(cache=True, nogil=True)
+    def _accumulate_postings(scores, posting_ids, posting_offsets, term_ids):
+        # Serial on purpose: terms share chunks, so parallel increments would race
+        for term in term_ids:
+            for i in range(posting_offsets[term], posting_offsets[term + 1]):
+                scores[posting_ids[i]] += 1
+
+
+def _ivf_lists(num_vectors: int) -> int:
+    """Number of inverted lists for an IVF index over num_vectors vectors."""
+    return int(4 * np.sqrt(num_vectors))
+
+
+def chunk_cache_key(text: str) -> str:
+    """Content-addressed cache key for a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).digest()[:16].hex()
+
+
+class ChunkEmbeddingCache:
+    """
+    Persistent per-chunk embedding cache keyed by the hash of the chunk text.
+    
+    Vectors are stored as float16 rows in a flat binary file that is
+    memory-mapped for reads and appended to for new entries; keys.json maps
+    each key to its row and records the model, precision and dimension that
+    produced them.
+    """
+    
+    def __init__(self, cache_dir: str, model_name: str, precision: str = "cpu/float32"):
+        """
+        Initialize the cache.
+        
+        Args:
+            cache_dir: Directory holding the cache files
+            model_name: Embedding model name; entries from other models are ignored
+            precision: Device and precision of the encoder, e.g. "cuda/float16";
+                entries encoded at another precision are ignored
+        """
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.precision = precision
+        self.vectors_path = os.path.join(cache_dir, "embeddings.f16.bin")
+        self.keys_path = os.path.join(cache_dir, "keys.json")
+        self.dim = None
+        self._rows = {}
+        self._count = 0  # Rows in the vectors file
+        self._load_keys()
+    
+    def _load_keys(self):
+        """
+        Read the key-to-row mapping, discarding it if another model or precision wrote it.
+        
+        The vectors file is cut back to the last row a key refers to, so an
+        interrupted append cannot shift the rows written after it; keys whose
+        rows were not fully written are dropped.
+        """
+        if not os.path.exists(self.keys_path) or not os.path.exists(self.vectors_path):
+            return
+        try:
+            data = _read_json(self.keys_path)
+            if data.get("model") != self.model_name or data.get("precision") != self.precision:
+                return
+            dim = data["dim"]
+            row_bytes = dim * np.dtype(np.float16).itemsize
+            available = os.path.getsize(self.vectors_path) // row_bytes
+            rows = {key: row for key, row in data["keys"].items() if row < available}
+            count = max(rows.values(), default=-1) + 1
+            if os.path.getsize(self.vectors_path) != count * row_bytes:
+                os.truncate(self.vectors_path, count * row_bytes)
+        except Exception as e:
+            logger.warning("Could not read embedding cache, ignoring it: %s", e)
+            return
+        self.dim = dim
+        self._rows = rows
+        self._count = count
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def lookup(self, keys: List[str]) -> Tuple[Optional[np.ndarray], List[int]]:
+        """
+        Fetch cached embeddings for the given keys.
+        
+        Args:
+            keys: Chunk cache keys
+            
+        Returns:
+            Tuple of (float32 array with a row per key, filled in for hits, or
+            None if the cache is empty) and the positions of keys that missed
+        """
+        if self.dim is None:
+            return None, list(range(len(keys)))
+        
+        hit_positions, hit_rows, missing = [], [], []
+        for pos, key in enumerate(keys):
+            row = self._rows.get(key)
+            if row is None:
+                missing.append(pos)
+            else:
+                hit_positions.append(pos)
+                hit_rows.append(row)
+        
+        embeddings = np.empty((len(keys), self.dim), dtype=np.float32)
+        if hit_rows:
+            try:
+                vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(self._count, self.dim))
+                embeddings[hit_positions] = vectors[hit_rows]
+                del vectors
+            except Exception as e:
+                # Treat an unreadable cache as empty rather than fail the build
+                logger.warning("Could not read embedding cache: %s", e)
+                return None, list(range(len(keys)))
+        return embeddings, missing
+    
+    def store(self, keys: List[str], embeddings: np.ndarray):
+        """
+        Append new embeddings to the cache.
+        
+        Args:
+            keys: Chunk cache keys, one per embedding row
+            embeddings: Embeddings to store (cast to float16)
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float16)
+        dim = embeddings.shape[1]
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if self.dim != dim:
+                # Different model or dimension: start a fresh cache
+                self.dim = dim
+                self._rows = {}
+                self._count = 0
+                open(self.vectors_path, "wb").close()
+            
+            # Write after the last known row, overwriting any partial one
+            first_row = self._count
+            with open(self.vectors_path, "r+b") as f:
+                f.seek(first_row * dim * embeddings.itemsize)
+                f.write(embeddings.tobytes())
+                f.truncate()
+            self._count = first_row + len(keys)
+            for i, key in enumerate(keys):
+                self._rows[key] = first_row + i
+            
+            # Write keys atomically so readers never see a partial file
+            tmp_path = self.keys_path + ".tmp"
+            _write_json(tmp_path, {"model": self.model_name, "precision": self.precision,
+                                   "dim": dim, "keys": self._rows})
+            os.replace(tmp_path, self.keys_path)
+        except Exception as e:
+            logger.warning("Could not update embedding cache: %s", e)
+
+
+class ChunkTextStore:
+    """
+    Chunk texts stored as concatenated UTF-8 in one memory-mapped file.
+    
+    An int64 offsets table (one entry per chunk plus an end marker) locates
+    each text, so chunks are decoded on demand instead of being kept alive as
+    Python strings, and the pages are shared between processes.
+    """
+    
+    def __init__(self, texts_path: str, offsets_path: str):
+        """
+        Initialize the store.
+        
+        Args:
+            texts_path: Path of the concatenated text file
+            offsets_path: Path of the offsets table (.npy)
+        """
+        self.texts_path = texts_path
+        self.offsets_path = offsets_path
+        self._buffer = None
+        self._offsets = None
+    
+    def write(self, texts: List[str]):
+        """
+        Replace the stored texts and reopen the store.
+        Files are swapped in atomically so existing maps stay valid.
+        
+        Args:
+            texts: Chunk texts, in index row order
+        """
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        tmp_texts_path = self.texts_path + ".tmp"
+        with open(tmp_texts_path, "wb") as f:
+            for i, text in enumerate(texts):
+                offsets[i + 1] = offsets[i] + f.write(text.encode("utf-8"))
+        tmp_offsets_path = self.offsets_path + ".tmp.npy"
+        np.save(tmp_offsets_path, offsets)
+        os.replace(tmp_texts_path, self.texts_path)
+        os.replace(tmp_offsets_path, self.offsets_path)
+        self.open()
+    
+    def append(self, texts: List[str]):
+        """
+        Add texts after the stored ones and reopen the store.
+        Existing texts are copied byte for byte rather than decoded.
+        
+        Args:
+            texts: Chunk texts for the next index rows
+        """
+        count = len(self)
+        offsets = np.zeros(count + len(texts) + 1, dtype=np.int64)
+        tmp_texts_path = self.texts_path + ".tmp"
+        with open(tmp_texts_path, "wb") as f:
+            if count:
+                offsets[:count + 1] = self._offsets
+                f.write(self._buffer[:offsets[count]])
+            for i, text in enumerate(texts, count):
+                offsets[i + 1] = offsets[i] + f.write(text.encode("utf-8"))
+        tmp_offsets_path = self.offsets_path + ".tmp.npy"
+        np.save(tmp_offsets_path, offsets)
+        os.replace(tmp_texts_path, self.texts_path)
+        os.replace(tmp_offsets_path, self.offsets_path)
+        self.open()
+    
+    def open(self) -> bool:
+        """
+        Memory-map the stored texts.
+        
+        Returns:
+            True if the store was opened, False if it is missing or unreadable
+        """
+        self.close()
+        if not os.path.exists(self.texts_path) or not os.path.exists(self.offsets_path):
+            return False
+        try:
+            offsets = np.load(self.offsets_path, mmap_mode="r")
+            with open(self.texts_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size != offsets[-1]:
+                    return False
+                # mmap cannot map an empty file
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        except Exception as e:
+            logger.warning("Could not open chunk text store: %s", e)
+            return False
+        self._buffer = buffer
+        self._offsets = offsets
+        return True
+    
+    def close(self):
+        """Release the memory maps."""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._buffer = None
+        self._offsets = None
+    
+    def __len__(self) -> int:
+        return 0 if self._offsets is None else len(self._offsets) - 1
+    
+    def __getitem__(self, idx: int) -> str:
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        return self._buffer[start:end].decode("utf-8")
+
+
+class ChunkMetadata:
+    """
+    Per-chunk index metadata stored as parallel arrays, one row per index vector.
+    
+    Car models are integer codes into a small string table, word positions are
+    int32 and cache keys fixed-width bytes, so the table is saved and loaded
+    with numpy instead of parsing and building a dict per chunk. Indexing a
+    row still returns the familiar metadata dict.
+    """
+    
+    def __init__(self, model_table: Optional[List[str]] = None, model_codes: Optional[np.ndarray] = None,
+                 chunk_indices: Optional[np.ndarray] = None, start_words: Optional[np.ndarray] = None,
+                 end_words: Optional[np.ndarray] = None, keys: Optional[np.ndarray] = None):
+        """
+        Initialize the table from its columns (empty if none are given).
+        
+        Args:
+            model_table: Distinct car model names
+            model_codes: Position in model_table of each chunk's car model
+            chunk_indices: Index of each chunk within its manual
+            start_words: First word position of each chunk
+            end_words: End word position of each chunk
+            keys: Embedding cache key of each chunk text
+        """
+        self.model_table = list(model_table or [])
+        code_dtype = np.int16 if len(self.model_table) <= np.iinfo(np.int16).max else np.int32
+        self.model_codes = np.asarray(model_codes if model_codes is not None else [], dtype=code_dtype)
+        self.chunk_indices = np.asarray(chunk_indices if chunk_indices is not None else [], dtype=np.int32)
+        self.start_words = np.asarray(start_words if start_words is not None else [], dtype=np.int32)
+        self.end_words = np.asarray(end_words if end_words is not None else [], dtype=np.int32)
+        self.keys = np.asarray(keys if keys is not None else [], dtype=np.bytes_)
+        self._model_ids = {model: code for code, model in enumerate(self.model_table)}
+    
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "ChunkMetadata":
+        """Build the table from per-chunk metadata dicts."""
+        model_ids = {}
+        codes = [model_ids.setdefault(record["car_model"], len(model_ids)) for record in records]
+        return cls(
+            list(model_ids), codes,
+            [record.get("chunk_index", 0) for record in records],
+            [record.get("start_word", 0) for record in records],
+            [record.get("end_word", 0) for record in records],
+            [record.get("key", "") for record in records]
+        )
+    
+    @classmethod
+    def load(cls, path: str) -> "ChunkMetadata":
+        """Load a table saved with save()."""
+        with np.load(path, allow_pickle=False) as columns:
+            return cls(
+                columns["model_table"].tolist(), columns["model_codes"], columns["chunk_indices"],
+                columns["start_words"], columns["end_words"], columns["keys"]
+            )
+    
+    def save(self, path: str):
+        """Save the columns to an uncompressed .npz file."""
+        with open(path, "wb") as f:
+            np.savez(
+                f, model_table=np.array(self.model_table, dtype=np.str_), model_codes=self.model_codes,
+                chunk_indices=self.chunk_indices, start_words=self.start_words,
+                end_words=self.end_words, keys=self.keys
+            )
+    
+    def model_id(self, car_model: str) -> Optional[int]:
+        """Code of a car model, or None if no chunk belongs to it."""
+        return self._model_ids.get(car_model)
+    
+    def car_model(self, idx: int) -> str:
+        """Car model of a chunk."""
+        return self.model_table[self.model_codes[idx]]
+    
+    def car_models(self) -> List[str]:
+        """Car model of every chunk, in row order."""
+        return [self.model_table[code] for code in self.model_codes.tolist()]
+    
+    def __len__(self) -> int:
+        return len(self.model_codes)
+    
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return ChunkMetadata(
+                self.model_table, self.model_codes[idx], self.chunk_indices[idx],
+                self.start_words[idx], self.end_words[idx], self.keys[idx]
+            )
+        return {
+            "car_model": self.car_model(idx),
+            "chunk_index": int(self.chunk_indices[idx]),
+            "start_word": int(self.start_words[idx]),
+            "end_word": int(self.end_words[idx]),
+            "key": self.keys[idx].decode("ascii")
+        }
+    
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+    
+    def __add__(self, other: "ChunkMetadata") -> "ChunkMetadata":
+        # Merge the model tables and map the other table's codes onto the result
+        table = list(self.model_table)
+        model_ids = dict(self._model_ids)
+        for model in other.model_table:
+            if model not in model_ids:
+                model_ids[model] = len(table)
+                table.append(model)
+        remap = np.array([model_ids[model] for model in other.model_table], dtype=np.int32)
+        return ChunkMetadata(
+            table, np.concatenate([self.model_codes, remap[other.model_codes]]),
+            np.concatenate([self.chunk_indices, other.chunk_indices]),
+            np.concatenate([self.start_words, other.start_words]),
+            np.concatenate([self.end_words, other.end_words]),
+            np.concatenate([self.keys, other.keys])
+        )
 
 
 class ManualSearchEngine:
     """Search engine for car manual content using semantic search."""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", index_path: str = "faiss_index.bin"):
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, index_path: str = "faiss_index.bin",
+                 model: Optional["SentenceTransformer"] = None, cache_dir: str = "embedding_cache",
+                 quantization: Optional[str] = None, query_encoder: Optional[EmbeddingBatcher] = None,
+                 verbose: bool = False, encode_device: str = "auto"):
         """
         Initialize the search engine with lazy model loading.
         
         Args:
             model_name: Sentence transformer model name
             index_path: Path to save/load FAISS index
+            model: Already loaded SentenceTransformer to share (loaded lazily if None)
+            cache_dir: Directory for the per-chunk embedding cache
+            quantization: Index vector storage: "int8" for 8-bit scalars (results
+                are reranked exactly against float16 embeddings), "float32" for
+                full precision, or None / "float16" for half precision
+            query_encoder: Batcher for query embeddings, shared so concurrent searches
+                are encoded together (a private batcher over the model if None)
+            verbose: Show a progress bar while encoding chunks for an index
+            encode_device: "auto" to encode queries on CPU when the model runs on
+                a GPU (index chunks still use the GPU), or "model" to encode
+                queries on the model's own device
         """
         self.model_name = model_name
-        self.model = None  # Load lazily on first use
+        self.model = model  # Load lazily on first use if not provided
+        self.query_encoder = query_encoder
+        self.verbose = verbose
+        self.encode_device = encode_device
         self.manuals_data = {}
         self.index = None
-        self.chunk_metadata = []
+        self.chunk_metadata = ChunkMetadata()
         self.index_path = index_path
-        self.metadata_path = "faiss_metadata.json"
+        # Companion files sit next to the index and share its base name
+        base_path = os.path.splitext(index_path)[0]
+        self.metadata_path = base_path + "_metadata.npz"
+        self.embeddings_path = base_path + "_embeddings.npy"
+        # sha256sum-style digests of the index and metadata, written last on save
+        self.checksum_path = base_path + ".sha256"
+        # Size and mtime of the checksummed files when their digests last matched,
+        # so unchanged files are not re-hashed on every load
+        self.stamp_path = base_path + ".stamp"
+        
+        # Chunk texts by index row, memory-mapped instead of kept in manuals_data
+        self._texts = ChunkTextStore(base_path + "_chunks.bin", base_path + "_offsets.npy")
+        self.quantization = quantization
+        self._quantized = False
+        
+        # Loaded indexes are memory-mapped read-only until they need to change
+        self._index_mapped = False
         
-        # Query embedding cache (LRU-style, max 100 queries)
-        self._query_cache = {}
+        # Normalized float16 chunk embeddings, one row per index vector
+        self._embeddings = None
+        
+        # Exact per-car-model sub-indexes over the embeddings, built on first use:
+        # model code -> (index, global row of each sub-index vector)
+        self._model_indexes = {}
+        
+        # Chunk embeddings by content hash, so rebuilds only encode new chunks;
+        # opened once the model (and so the precision it encodes at) is known
+        self.cache_dir = cache_dir
+        self._embedding_cache = None
+        
+        # Query embedding cache (LRU, max 100 queries)
+        self._query_cache = OrderedDict()
         self._cache_size = 100
+        
+        # Search result cache (LRU): (query, car_model, top_k) -> results,
+        # cleared whenever the index changes
+        self._result_cache = OrderedDict()
+        self._result_cache_size = 256
+        
+        # Keyword inverted index in CSR form: token -> term id, whose sorted
+        # int32 ids into _posting_chunks are _posting_ids[offsets[t]:offsets[t + 1]]
+        self._vocabulary = None
+        self._posting_ids = None
+        self._posting_offsets = None
+        self._postings_source = None
+        self._posting_chunks = []
+        self._posting_texts = []
+        self._posting_model_ids = None
+        self._posting_models = []
+    
+    @property
+    def chunk_metadata(self) -> ChunkMetadata:
+        """Columnar metadata of the index rows."""
+        return self._chunk_metadata
+    
+    @chunk_metadata.setter
+    def chunk_metadata(self, value):
+        # Per-chunk metadata dicts are accepted and converted to columns
+        self._chunk_metadata = value if isinstance(value, ChunkMetadata) else ChunkMetadata.from_records(value)
     
     def _ensure_model_loaded(self):
-        """Load sentence transformer model if not already loaded."""
+        """Load sentence transformer model if not already loaded, sharing it between engines."""
         if self.model is None:
-            print(f"Loading sentence transformer model: {self.model_name}...")
-            import torch
-            device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            self.model = SentenceTransformer(self.model_name, device=device)
-            # Ensure model is on correct device
-            self.model.to(device)
+            model = _model_cache.get((self.model_name, "index"))
+            if model is None:
+                model = load_embedding_model(self.model_name)
+                if model.device.type == "cuda":
+                    # Half precision runs on tensor cores; kept only if embeddings don't drift
+                    model = quantize_embedding_model(model, "float16")
+                _model_cache[(self.model_name, "index")] = model
+            self.model = model
+    
+    def _ensure_query_encoder(self):
+        """Create the query batcher over the query model if none was provided."""
+        if self.query_encoder is None:
+            self._ensure_model_loaded()
+            self.query_encoder = EmbeddingBatcher(self._query_model())
+    
+    def _query_model(self) -> "SentenceTransformer":
+        """
+        Get the model that encodes queries.
+        
+        With encode_device "auto", a model on a GPU keeps encoding index
+        chunks in bulk there, while queries (a few texts at a time) go to a
+        float32 CPU copy: for them the host-device round trip and kernel
+        launches cost more than the forward pass saves.
+        """
+        if self.encode_device != "auto" or self.model.device.type == "cpu":
+            return self.model
+        model = _model_cache.get((self.model_name, "query"))
+        if model is None:
+            model = load_embedding_model(self.model_name, device="cpu")
+            _model_cache[(self.model_name, "query")] = model
+        return model
     
     def _get_cached_embedding(self, query: str) -> np.ndarray:
         """
         Get cached query embedding or generate new one.
+        Embeddings are normalized before caching, so hits need no extra work.
         
         Args:
             query: Search query string
             
         Returns:
-            Query embedding vector
+            Unit-length float32 query embedding vector
         """
-        query_lower = query.lower().strip()
+        return self._get_cached_embeddings([query])[0]
+    
+    def _get_cached_embeddings(self, queries: List[str]) -> np.ndarray:
+        """
+        Get query embeddings, encoding all cache misses in one model call.
         
-        # Check cache
-        if query_lower in self._query_cache:
-            return self._query_cache[query_lower]
+        Args:
+            queries: Search query strings
+            
+        Returns:
+            Contiguous float32 array of unit-length embeddings, one row per query.
+            A single query gets its cached (1, dimension) array itself, which
+            must not be modified.
+        """
+        keys = [query.lower().strip() for query in queries]
         
-        # Generate new embedding
-        self._ensure_model_loaded()
-        embedding = self.model.encode([query])[0]
+        # Collect cache misses (a hit becomes the most recently used entry)
+        missing = {}
+        for query, key in zip(queries, keys):
+            if key in self._query_cache:
+                self._query_cache.move_to_end(key)
+            elif key not in missing:
+                missing[key] = query
+        
+        embeddings = {}
+        if missing:
+            # Generate new embeddings (batched with other concurrent queries)
+            self._ensure_query_encoder()
+            encoded = np.array(self.query_encoder.encode(list(missing.values())), dtype=np.float32)
+            faiss.normalize_L2(encoded)
+            # Cache each as its own contiguous (1, dimension) array, ready for FAISS
+            embeddings = {key: encoded[i:i + 1].copy() for i, key in enumerate(missing)}
         
-        # Simple LRU: remove oldest if cache full
-        if len(self._query_cache) >= self._cache_size:
-            oldest_key = next(iter(self._query_cache))
-            del self._query_cache[oldest_key]
+        rows = [embeddings[key] if key in embeddings else self._query_cache[key] for key in keys]
+        result = rows[0] if len(rows) == 1 else np.concatenate(rows)
         
-        self._query_cache[query_lower] = embedding
-        return embedding
+        # Evict the least recently used queries if the cache is full
+        for key, embedding in embeddings.items():
+            self._query_cache[key] = embedding
+            if len(self._query_cache) > self._cache_size:
+                self._query_cache.popitem(last=False)
+        return result
         
     def build_index(self, manuals_data: Dict, force_rebuild: bool = False):
         """
         Build FAISS index from manual chunks.
         
+        A cached index is reused only if it was built from the same chunks.
+        If manuals were only appended, just their chunks are added to it;
+        otherwise the index is rebuilt, re-encoding only chunks that are not
+        in the embedding cache. Chunk texts are moved into the memory-mapped
+        text store; the engine keeps only per-manual summaries in manuals_data.
+        
         Args:
             manuals_data: Dictionary of manual data
             force_rebuild: Force rebuild even if cached index exists
         """
+        all_chunks, keys, chunk_metadata = self._collect_chunks(manuals_data)
+        
         # Try to load existing index first
         if not force_rebuild and self.load_index():
-            print("Using cached FAISS index")
+            if self._update_loaded_index(manuals_data, all_chunks, keys, chunk_metadata):
+                return
+            logger.info("Cached FAISS index is out of date")
+        
+        logger.info("Building new FAISS index...")
+        self.chunk_metadata = chunk_metadata
+        self._result_cache.clear()
+        
+        if not all_chunks:
+            logger.warning("No chunks found to index!")
             self.manuals_data = manuals_data
             return
         
-        print("Building new FAISS index...")
-        self.manuals_data = manuals_data
-        all_chunks = []
-        self.chunk_metadata = []
-        
-        # Collect all chunks with metadata
-        for model, data in manuals_data.items():
-            for idx, chunk in enumerate(data["chunks"]):
-                all_chunks.append(chunk["text"])
-                self.chunk_metadata.append({
-                    "car_model": model,
-                    "chunk_index": idx,
-                    "start_word": chunk.get("start_word", 0),
-                    "end_word": chunk.get("end_word", 0)
-                })
+        self.index = None
+        self._index_mapped = False
+        self._embeddings = None
+        encoded = self._add_chunks(all_chunks, keys)
+        logger.info("Index built with %s vectors (%s newly encoded)", self.index.ntotal, encoded)
         
-        if not all_chunks:
-            print("No chunks found to index!")
+        # Save index for future use (texts first: the checksum file covers them)
+        self._texts.write(all_chunks)
+        self.save_index()
+        self._set_manuals_summary(manuals_data)
+        self._build_postings()
+    
+    def rebuild_if_stale(self, manuals_data: Dict) -> bool:
+        """
+        Bring the index in line with manuals_data, doing only the work needed.
+        
+        Unlike build_index this compares against the index already in memory,
+        so an unchanged corpus costs no disk access and appended manuals are
+        added incrementally. Other changes rebuild the index.
+        
+        Args:
+            manuals_data: Dictionary of manual data
+            
+        Returns:
+            True if the index was rebuilt or extended, False if the index in
+            memory (or the saved one) was already up to date
+        """
+        if self.index is None and not self.load_index():
+            self.build_index(manuals_data, force_rebuild=True)
+            return True
+        
+        all_chunks, keys, chunk_metadata = self._collect_chunks(manuals_data)
+        if self._same_chunks(chunk_metadata, len(chunk_metadata)):
+            self._set_manuals_summary(manuals_data)
+            return False
+        if not self._update_loaded_index(manuals_data, all_chunks, keys, chunk_metadata):
+            self.build_index(manuals_data, force_rebuild=True)
+        return True
+    
+    def add_manual(self, model_name: str, chunks: List[Dict]):
+        """
+        Add one new manual to the index without touching the existing chunks.
+        
+        Only the new chunks are encoded (or taken from the embedding cache),
+        then the index, metadata and text store are saved. Without an index
+        in memory the saved one is loaded first. If neither exists, or the
+        index and its text store no longer line up, a new index is built from
+        this manual alone.
+        
+        Args:
+            model_name: Car model of the manual; must not be indexed yet
+            chunks: Chunk dicts with "text" and optional "start_word" / "end_word"
+        """
+        if self.index is not None and not self._rows_aligned():
+            logger.warning("Index and chunk text store are out of step, reloading the saved index")
+            self._clear_index()
+        if self.index is None and not self.load_index():
+            if self.manuals_data:
+                logger.warning("Rebuilding the index from %s only; re-run build_index for the other manuals",
+                               model_name)
+            self.build_index({model_name: {"car_model": model_name, "chunks": chunks}}, force_rebuild=True)
             return
+        if self.chunk_metadata.model_id(model_name) is not None:
+            raise ValueError(f"{model_name} is already indexed; use build_index to replace it")
+        if not chunks:
+            return
+        if not self.manuals_data:
+            # Freshly loaded index: summarize its manuals from the metadata
+            counts = np.bincount(self.chunk_metadata.model_codes, minlength=len(self.chunk_metadata.model_table))
+            self.manuals_data = {
+                model: {"car_model": model, "total_chunks": int(count)}
+                for model, count in zip(self.chunk_metadata.model_table, counts)
+            }
+        
+        texts = [chunk["text"] for chunk in chunks]
+        keys = [chunk_cache_key(text) for text in texts]
+        self._append_to_index(texts, keys, ChunkMetadata(
+            [model_name], np.zeros(len(chunks)), np.arange(len(chunks)),
+            [chunk.get("start_word", 0) for chunk in chunks],
+            [chunk.get("end_word", 0) for chunk in chunks],
+            keys
+        ))
+        self._texts.append(texts)
+        self.save_index()
+        self.manuals_data[model_name] = {"car_model": model_name, "total_chunks": len(chunks)}
+        # Keyword postings are rebuilt on the next keyword search
+        self._vocabulary = None
+    
+    def _collect_chunks(self, manuals_data: Dict) -> Tuple[List[str], List[str], ChunkMetadata]:
+        """
+        Collect all chunks of the manuals in index row order.
+        
+        Returns:
+            Tuple of (chunk texts, cache key of each text, columnar metadata)
+        """
+        counts = np.fromiter(
+            (len(data["chunks"]) for data in manuals_data.values()), dtype=np.int64, count=len(manuals_data)
+        )
+        total = int(counts.sum())
+        chunks = [chunk for data in manuals_data.values() for chunk in data["chunks"]]
+        all_chunks = [chunk["text"] for chunk in chunks]
+        keys = [chunk_cache_key(text) for text in all_chunks]
+        
+        # Columns are filled in place at their final size: manual code of each
+        # chunk, and its position within the manual as row minus manual start
+        model_codes = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+        manual_starts = np.cumsum(counts) - counts
+        chunk_indices = np.arange(total, dtype=np.int32)
+        chunk_indices -= manual_starts.astype(np.int32)[model_codes]
+        chunk_metadata = ChunkMetadata(
+            list(manuals_data), model_codes, chunk_indices,
+            np.fromiter((chunk.get("start_word", 0) for chunk in chunks), dtype=np.int32, count=total),
+            np.fromiter((chunk.get("end_word", 0) for chunk in chunks), dtype=np.int32, count=total),
+            keys
+        )
+        return all_chunks, keys, chunk_metadata
+    
+    def _rows_aligned(self) -> bool:
+        """Whether the index, metadata and text store have one row per chunk each."""
+        return self.index.ntotal == len(self.chunk_metadata) == len(self._texts)
+    
+    def _same_chunks(self, chunk_metadata: ChunkMetadata, count: int) -> bool:
+        """Whether the first count rows of chunk_metadata are the indexed chunks, by content and car model."""
+        cached = self.chunk_metadata
+        return count == len(cached) and np.array_equal(cached.keys, chunk_metadata.keys[:count]) \
+            and cached.car_models() == chunk_metadata[:count].car_models()
+    
+    def _update_loaded_index(self, manuals_data: Dict, all_chunks: List[str], keys: List[str],
+                             chunk_metadata: ChunkMetadata) -> bool:
+        """
+        Reuse the loaded index for the collected chunks, adding any appended ones.
         
-        # Generate embeddings
+        Returns:
+            True if the index now covers the chunks, False if it must be rebuilt
+        """
+        start = len(self.chunk_metadata)
+        if not 0 < start <= len(keys) or not self._same_chunks(chunk_metadata, start):
+            return False
+        
+        if start == len(keys):
+            # load_index only accepts a text store verified against the index
+            logger.info("Using cached FAISS index")
+        else:
+            logger.info("Adding %s new chunks to cached FAISS index...", len(keys) - start)
+            self._append_to_index(all_chunks[start:], keys[start:], chunk_metadata[start:])
+            self._texts.write(all_chunks)
+            self.save_index()
+        self._set_manuals_summary(manuals_data)
+        self._build_postings()
+        return True
+    
+    def _append_to_index(self, texts: List[str], keys: List[str], chunk_metadata: ChunkMetadata):
+        """
+        Add chunks to the loaded index; the caller updates the text store and saves.
+        
+        Args:
+            texts: Chunk texts to add
+            keys: Cache key for each text
+            chunk_metadata: Metadata of the chunks, in the same order
+        """
+        encoded = self._add_chunks(texts, keys)
+        self.chunk_metadata = self.chunk_metadata + chunk_metadata
+        logger.info("Index updated to %s vectors (%s newly encoded)", self.index.ntotal, encoded)
+    
+    def _new_index(self, dimension: int, num_vectors: int):
+        """
+        Create an empty inner-product FAISS index suited to the corpus size.
+        
+        Args:
+            dimension: Embedding dimension
+            num_vectors: Number of vectors that will be added
+            
+        Returns:
+            Flat index for small corpora, HNSW for medium and IVF for large ones
+        """
+        if num_vectors < FLAT_MAX_VECTORS:
+            layout = ""
+        elif num_vectors < IVF_MIN_VECTORS:
+            layout = f"HNSW{HNSW_M},"
+        else:
+            layout = f"IVF{_ivf_lists(num_vectors)},"
+        storage = {"int8": "SQ8", "float32": "Flat"}.get(self.quantization, "SQfp16")
+        
+        index = faiss.index_factory(dimension, layout + storage, faiss.METRIC_INNER_PRODUCT)
+        if hasattr(index, "hnsw"):
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+    
+    def _training_sample(self, texts: List[str], keys: List[str]) -> Tuple[np.ndarray, int]:
+        """
+        Embed an evenly spaced sample of chunks to train a new index on.
+        Sampled vectors go to the embedding cache, so adding them later is free.
+        
+        Returns:
+            Tuple of (sample embeddings, number of texts that were encoded)
+        """
+        size = EMBED_BATCH_SIZE
+        if len(texts) >= IVF_MIN_VECTORS:
+            size = max(size, IVF_TRAIN_POINTS_PER_LIST * _ivf_lists(len(texts)))
+        positions = np.unique(np.linspace(0, len(texts) - 1, min(size, len(texts))).astype(np.int64))
+        return self._embed_chunks([texts[i] for i in positions], [keys[i] for i in positions])
+    
+    def _add_chunks(self, texts: List[str], keys: List[str]) -> int:
+        """
+        Embed chunks and add them to the index in batches of EMBED_BATCH_SIZE,
+        creating (and if needed training) the index first if there is none.
+        Only one batch of float32 vectors is held at a time.
+        
+        Args:
+            texts: Chunk texts
+            keys: Cache key for each text
+            
+        Returns:
+            Number of distinct chunks that had to be encoded (not found in the cache)
+        """
+        offset = 0 if self.index is None else self.index.ntotal
+        # Without stored embeddings for existing rows, don't keep any
+        keep_embeddings = offset == 0 or self._embeddings is not None
+        encoded = 0
+        
+        if self._index_mapped:
+            # A memory-mapped index cannot grow: load a writable copy first
+            self.index = faiss.read_index(self.index_path)
+            self._index_mapped = False
+        
+        if self.index is None:
+            sample, encoded = self._embed_chunks(texts[:1], keys[:1])
+            self.index = self._new_index(sample.shape[1], len(texts))
+            if not self.index.is_trained:
+                # Quantizer ranges and IVF centroids are learned from a sample
+                sample, sample_encoded = self._training_sample(texts, keys)
+                encoded += sample_encoded
+                self.index.train(sample)
+            del sample
+        
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch, batch_encoded = self._embed_chunks(
+                texts[start:start + EMBED_BATCH_SIZE], keys[start:start + EMBED_BATCH_SIZE]
+            )
+            encoded += batch_encoded
+            self.index.add(batch)
+            
+            # Keep normalized float16 copies so callers can reuse chunk vectors
+            if keep_embeddings:
+                if start == 0:
+                    grown = np.empty((offset + len(texts), batch.shape[1]), dtype=np.float16)
+                    if offset:
+                        grown[:offset] = self._embeddings
+                    self._embeddings = grown
+                self._embeddings[offset + start:offset + start + len(batch)] = batch
+        
+        if not keep_embeddings:
+            self._embeddings = None
+        self._quantized = _is_quantized(self.index)
+        self._model_indexes = {}
+        self._result_cache.clear()
+        return encoded
+    
+    def _chunk_embedding_cache(self) -> ChunkEmbeddingCache:
+        """Get the embedding cache for the loaded model's current device and precision."""
+        precision = _model_precision(self.model)
+        if self._embedding_cache is None or self._embedding_cache.precision != precision:
+            self._embedding_cache = ChunkEmbeddingCache(self.cache_dir, self.model_name, precision)
+        return self._embedding_cache
+    
+    def _embed_chunks(self, texts: List[str], keys: List[str]) -> Tuple[np.ndarray, int]:
+        """
+        Get normalized float32 embeddings for chunks, encoding only cache misses.
+        
+        Args:
+            texts: Chunk texts
+            keys: Cache key for each text
+            
+        Returns:
+            Tuple of (contiguous float32 array of unit-length embeddings,
+            number of distinct texts that were encoded)
+        """
         self._ensure_model_loaded()
-        print(f"Generating embeddings for {len(all_chunks)} chunks...")
-        embeddings = self.model.encode(all_chunks, show_progress_bar=True)
+        cache = self._chunk_embedding_cache()
+        embeddings, missing = cache.lookup(keys)
         
-        # Build FAISS index
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(embeddings.astype('float32'))
+        # Encode each distinct missing text once (manuals share boilerplate)
+        rows_by_key = {}
+        for pos in missing:
+            rows_by_key.setdefault(keys[pos], []).append(pos)
         
-        print(f"Index built with {self.index.ntotal} vectors")
+        if rows_by_key:
+            unique_keys = list(rows_by_key)
+            # encode() sorts inputs by length internally, so batches are padded evenly;
+            # inference mode also skips autograd's version-counter bookkeeping
+            with _inference_mode():
+                new_embeddings = self.model.encode(
+                    [texts[rows_by_key[key][0]] for key in unique_keys],
+                    batch_size=ENCODE_BATCH_SIZE,
+                    convert_to_numpy=True,
+                    show_progress_bar=self.verbose
+                )
+            # Round through float16 so fresh and cached vectors are identical
+            new_embeddings = np.asarray(new_embeddings, dtype=np.float16).astype(np.float32)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), new_embeddings.shape[1]), dtype=np.float32)
+            for key, embedding in zip(unique_keys, new_embeddings):
+                embeddings[rows_by_key[key]] = embedding
+            cache.store(unique_keys, new_embeddings)
         
-        # Save index for future use
-        self.save_index()
+        # Normalize in place so inner product equals cosine similarity
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)
+        return embeddings, len(rows_by_key)
+    
+    def _set_manuals_summary(self, manuals_data: Dict):
+        """Keep only per-manual summaries; chunk texts are served by the text store."""
+        self.manuals_data = {
+            model: {"car_model": data.get("car_model", model), "total_chunks": len(data["chunks"])}
+            for model, data in manuals_data.items()
+        }
+    
+    def _build_postings(self):
+        """Build the token -> chunk ids inverted index used by keyword search."""
+        if any("chunks" in data for data in self.manuals_data.values()):
+            # Manual data was set directly rather than indexed: use its chunks
+            self._posting_chunks = [
+                (model, idx) for model, data in self.manuals_data.items()
+                for idx in range(len(data["chunks"]))
+            ]
+            self._posting_texts = [
+                chunk["text"] for data in self.manuals_data.values() for chunk in data["chunks"]
+            ]
+        else:
+            self._posting_chunks = list(zip(
+                self.chunk_metadata.car_models(), self.chunk_metadata.chunk_indices.tolist()
+            ))
+            self._posting_texts = self._texts
+        
+        token_chunks = {}
+        model_to_id = {}
+        model_ids = []
+        for chunk_id, (model, _) in enumerate(self._posting_chunks):
+            model_ids.append(model_to_id.setdefault(model, len(model_to_id)))
+            for token in set(_TOKEN_RE.findall(self._posting_texts[chunk_id].lower())):
+                token_chunks.setdefault(token, []).append(chunk_id)
+        
+        # Chunk ids are appended in increasing order, so each list is already sorted
+        self._vocabulary = {token: term for term, token in enumerate(token_chunks)}
+        lengths = np.fromiter((len(ids) for ids in token_chunks.values()), dtype=np.int64, count=len(token_chunks))
+        self._posting_offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self._posting_ids = np.fromiter(
+            (chunk_id for ids in token_chunks.values() for chunk_id in ids),
+            dtype=np.int32, count=int(self._posting_offsets[-1])
+        )
+        self._posting_models = list(model_to_id)
+        self._posting_model_ids = np.array(model_ids, dtype=np.int32)
+        self._postings_source = self.manuals_data
     
     def save_index(self):
-        """Save FAISS index and metadata to disk."""
+        """
+        Save FAISS index and metadata to disk.
+        
+        Each file is written to a temporary path and renamed into place, so
+        readers (and memory maps of the previous files) never see a partial
+        write. The checksum file goes last and only matches complete saves;
+        it also covers the chunk text store, which must be written first.
+        The stamp file written after it lets later loads skip re-hashing.
+        """
         if self.index is None or len(self.chunk_metadata) == 0:
             return
         
         try:
-            faiss.write_index(self.index, self.index_path)
-            with open(self.metadata_path, "w", encoding="utf-8") as f:
-                json.dump(self.chunk_metadata, f, indent=2)
-            print(f"Index saved to {self.index_path}")
+            tmp_index_path = self.index_path + ".tmp"
+            faiss.write_index(self.index, tmp_index_path)
+            tmp_metadata_path = self.metadata_path + ".tmp"
+            self.chunk_metadata.save(tmp_metadata_path)
+            if self._embeddings is not None:
+                tmp_embeddings_path = self.embeddings_path + ".tmp.npy"
+                np.save(tmp_embeddings_path, self._embeddings)
+                os.replace(tmp_embeddings_path, self.embeddings_path)
+            elif os.path.exists(self.embeddings_path):
+                os.remove(self.embeddings_path)
+            os.replace(tmp_index_path, self.index_path)
+            os.replace(tmp_metadata_path, self.metadata_path)
+            digests = {path: _file_sha256(path) for path in self._checksummed_paths()}
+            
+            tmp_checksum_path = self.checksum_path + ".tmp"
+            with open(tmp_checksum_path, "w", encoding="utf-8") as f:
+                for path, digest in digests.items():
+                    f.write(f"{digest}  {os.path.basename(path)}\n")
+            os.replace(tmp_checksum_path, self.checksum_path)
+            self._write_stamps()
+            logger.info("Index saved to %s", self.index_path)
         except Exception as e:
-            print(f"Warning: Could not save index: {e}")
+            logger.warning("Could not save index: %s", e)
+    
+    def _checksummed_paths(self) -> List[str]:
+        """Files that must match the checksum file for a saved index to be used."""
+        paths = [self.index_path, self.metadata_path, self._texts.texts_path, self._texts.offsets_path]
+        if os.path.exists(self.embeddings_path):
+            paths.append(self.embeddings_path)
+        return paths
+    
+    def _stamped_paths(self) -> List[str]:
+        """Checksummed files plus the checksum file itself, which the stamp file covers."""
+        return self._checksummed_paths() + [self.checksum_path]
+    
+    def _write_stamps(self):
+        """Record the size and mtime of files whose digests are known to match."""
+        try:
+            tmp_stamp_path = self.stamp_path + ".tmp"
+            with open(tmp_stamp_path, "w", encoding="utf-8") as f:
+                for path in self._stamped_paths():
+                    f.write(f"{_file_stamp(path)}  {os.path.basename(path)}\n")
+            os.replace(tmp_stamp_path, self.stamp_path)
+        except OSError as e:
+            logger.warning("Could not write index stamp file: %s", e)
+    
+    def _stamps_match(self) -> bool:
+        """Whether every saved file still has the size and mtime it had when last verified."""
+        stamps = {}
+        try:
+            with open(self.stamp_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        # Same layout as the checksum file: stamp, two spaces, file name
+                        stamp, name = line.rstrip("\n").split("  ", 1)
+                        stamps[name] = stamp
+            paths = self._stamped_paths()
+            return len(stamps) == len(paths) and all(
+                stamps.get(os.path.basename(path)) == _file_stamp(path) for path in paths
+            )
+        except (OSError, ValueError):
+            return False
+    
+    def _verify_checksums(self) -> bool:
+        """
+        Check the saved index files against the digests written by save_index.
+        
+        Files are only hashed when their size or mtime differs from the stamp
+        file, so loading an unchanged index does not read it all from disk.
+        """
+        if not os.path.exists(self.checksum_path):
+            return False
+        if self._stamps_match():
+            return True
+        expected = {}
+        try:
+            with open(self.checksum_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        # sha256sum format: digest, two spaces, file name (which may contain spaces)
+                        digest, name = line.rstrip("\n").split("  ", 1)
+                        expected[name] = digest
+        except ValueError:
+            logger.warning("Malformed checksum file %s", self.checksum_path)
+            return False
+        if not all(
+            os.path.exists(path) and expected.get(os.path.basename(path)) == _file_sha256(path)
+            for path in self._checksummed_paths()
+        ):
+            return False
+        self._write_stamps()
+        return True
     
     def load_index(self) -> bool:
         """
@@ -146,15 +1344,46 @@ class ManualSearchEngine:
             return False
         
         try:
-            self.index = faiss.read_index(self.index_path)
-            with open(self.metadata_path, "r", encoding="utf-8") as f:
-                self.chunk_metadata = json.load(f)
-            print(f"Index loaded from {self.index_path} ({self.index.ntotal} vectors)")
+            if not self._verify_checksums():
+                logger.warning("Cached index files are incomplete or do not match, ignoring them")
+                return False
+            self.index, self._index_mapped = _read_index_mmap(self.index_path)
+            self.chunk_metadata = ChunkMetadata.load(self.metadata_path)
+            self._embeddings = self._load_embeddings()
+            self._quantized = _is_quantized(self.index)
+            self._model_indexes = {}
+            self._result_cache.clear()
+            if not self._texts.open() or len(self._texts) != self.index.ntotal \
+                    or len(self.chunk_metadata) != self.index.ntotal:
+                logger.warning("Cached index files do not line up with the index, ignoring them")
+                self._clear_index()
+                return False
+            logger.info("Index loaded from %s (%s vectors)", self.index_path, self.index.ntotal)
             return True
         except Exception as e:
-            print(f"Warning: Could not load index: {e}")
+            logger.warning("Could not load index: %s", e)
+            self._clear_index()
             return False
     
+    def _clear_index(self):
+        """Drop the index and everything aligned with its rows."""
+        self.index = None
+        self._index_mapped = False
+        self.chunk_metadata = ChunkMetadata()
+        self._embeddings = None
+        self._model_indexes = {}
+        self._result_cache.clear()
+        self._texts.close()
+    
+    def _load_embeddings(self) -> Optional[np.ndarray]:
+        """Memory-map stored chunk embeddings if they match the loaded index."""
+        if not os.path.exists(self.embeddings_path):
+            return None
+        embeddings = np.load(self.embeddings_path, mmap_mode="r")
+        if embeddings.shape[0] != self.index.ntotal:
+            return None
+        return embeddings
+    
     def search(self, query: str, car_model: str = None, top_k: int = 5) -> List[Dict]:
         """
         Search for relevant chunks using cached embeddings when possible.
@@ -165,71 +1394,195 @@ class ManualSearchEngine:
             top_k: Number of results to return
             
         Returns:
-            List of search results with text, car_model, distance, and chunk_index
+            List of search results with text, car_model, distance, chunk_index
+            and (when available) the chunk's normalized embedding
         """
-        if self.index is None or len(self.chunk_metadata) == 0:
-            return []
+        return self.search_batch([query], car_model, top_k)[0]
+    
+    def search_batch(self, queries: List[str], car_model: str = None, top_k: int = 5) -> List[List[Dict]]:
+        """
+        Search for several queries with one encode call and one index search.
         
-        # Get query embedding (from cache if available)
-        query_embedding = self._get_cached_embedding(query)
+        Args:
+            queries: Search query strings
+            car_model: Optional car model to filter results
+            top_k: Number of results to return per query
+            
+        Returns:
+            One list of search results per query, as returned by search()
+        """
+        if self.index is None or len(self.chunk_metadata) == 0 or not queries:
+            return [[] for _ in queries]
         
-        # Ensure 2D array for FAISS (shape: [1, dimension])
-        if query_embedding.ndim == 1:
-            query_embedding = query_embedding.reshape(1, -1)
+        # Repeated queries skip encoding and FAISS entirely
+        keys = [(query.lower().strip(), car_model or "", top_k) for query in queries]
+        results = [None] * len(queries)
+        missing = {}
+        for i, key in enumerate(keys):
+            if key in self._result_cache:
+                self._result_cache.move_to_end(key)
+                results[i] = self._result_cache[key]
+            else:
+                missing.setdefault(key, queries[i])
         
-        # Search in index
-        k = min(top_k * 2, self.index.ntotal)  # Get more results to filter by model
-        distances, indices = self.index.search(
-            query_embedding.astype('float32'), 
-            k
-        )
+        if missing:
+            found = dict(zip(missing, self._search_index(list(missing.values()), car_model, top_k)))
+            for key, key_results in found.items():
+                self._result_cache[key] = key_results
+                if len(self._result_cache) > self._result_cache_size:
+                    self._result_cache.popitem(last=False)
+            results = [found[key] if result is None else result for key, result in zip(keys, results)]
+        
+        # Callers may annotate and reorder results, so hand out copies
+        return [[dict(result) for result in query_results] for query_results in results]
+    
+    def _search_index(self, queries: List[str], car_model: str, top_k: int) -> List[List[Dict]]:
+        """Run search_batch() for queries that are not in the result cache."""
+        # Get query embeddings (from cache if available) as a (B, dimension) array
+        query_embeddings = self._get_cached_embeddings(queries)
+        inner_product = self.index.metric_type == faiss.METRIC_INNER_PRODUCT
+        
+        target_id = None
+        if car_model:
+            target_id = self.chunk_metadata.model_id(car_model)
+            if target_id is None:
+                return [[] for _ in queries]
+        
+        rerank = self._quantized and self._embeddings is not None
+        if target_id is not None and self._embeddings is not None:
+            # Search only this model's chunks exactly: nothing to filter or rerank
+            model_index, rows = self._model_index(target_id)
+            all_scores, sub_ids = model_index.search(query_embeddings, min(top_k, model_index.ntotal))
+            all_indices = np.where(sub_ids >= 0, rows[sub_ids], -1)
+            target_id = None
+            rerank = False
+        else:
+            # Search in index, fetching extra candidates only when some will be
+            # filtered out by model or reordered by exact reranking
+            oversample = QUANTIZED_OVERSAMPLE if rerank else (2 if car_model else 1)
+            k = min(top_k * oversample, self.index.ntotal)
+            if hasattr(self.index, "hnsw"):
+                self.index.hnsw.efSearch = max(HNSW_MIN_EF_SEARCH, top_k * 8)
+            if hasattr(self.index, "nprobe"):
+                self.index.nprobe = IVF_NPROBE
+            all_scores, all_indices = self.index.search(query_embeddings, k)
         
         results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            metadata = self.chunk_metadata[idx]
+        for query_embedding, scores, ids in zip(query_embeddings, all_scores, all_indices):
+            if rerank:
+                # Rescore approximate candidates exactly against the float16 embeddings
+                ids = ids[ids >= 0]
+                exact = np.asarray(self._embeddings[ids], dtype=np.float32) @ query_embedding
+                order = np.argsort(-exact)
+                ids = ids[order]
+                scores = exact[order]
             
-            # Filter by car model if specified
-            if car_model and metadata["car_model"] != car_model:
-                continue
+            # Report squared L2 distance between unit vectors (2 - 2 * cosine) for
+            # inner-product indexes, so "lower is better" thresholds keep their meaning
+            distances = 2.0 * (1.0 - scores) if inner_product else scores
             
-            chunk_data = self.manuals_data[metadata["car_model"]]["chunks"][metadata["chunk_index"]]
+            # Drop empty slots and other car models in one vectorized pass
+            valid = ids >= 0
+            if target_id is not None:
+                valid &= self.chunk_metadata.model_codes[np.where(valid, ids, 0)] == target_id
+            kept = ids[valid][:top_k]
+            kept_distances = distances[valid][:top_k]
             
-            results.append({
-                "text": chunk_data["text"],
-                "car_model": metadata["car_model"],
-                "distance": float(dist),
-                "chunk_index": metadata["chunk_index"]
-            })
+            results.append(self._make_results(kept, kept_distances))
+        return results
+    
+    def _model_index(self, model_id: int) -> Tuple[faiss.Index, np.ndarray]:
+        """
+        Get the exact inner-product sub-index over one car model's chunks.
+        
+        Args:
+            model_id: Car model code in chunk_metadata
             
-            if len(results) >= top_k:
-                break
+        Returns:
+            Tuple of (float16 flat index, global index row of each of its vectors)
+        """
+        if model_id not in self._model_indexes:
+            rows = np.flatnonzero(self.chunk_metadata.model_codes == model_id)
+            model_index = faiss.index_factory(self._embeddings.shape[1], "SQfp16", faiss.METRIC_INNER_PRODUCT)
+            for start in range(0, len(rows), EMBED_BATCH_SIZE):
+                model_index.add(np.asarray(self._embeddings[rows[start:start + EMBED_BATCH_SIZE]], dtype=np.float32))
+            self._model_indexes[model_id] = (model_index, rows)
+        return self._model_indexes[model_id]
+    
+    def _make_results(self, ids: np.ndarray, distances: np.ndarray) -> List[Dict]:
+        """
+        Build search result dicts for index rows.
+        Metadata columns and embeddings are gathered for all rows at once.
         
+        Args:
+            ids: Index rows, best first
+            distances: Distance of each row to the query
+            
+        Returns:
+            List of search results in the same order
+        """
+        metadata = self.chunk_metadata
+        models = [metadata.model_table[code] for code in metadata.model_codes[ids].tolist()]
+        results = [
+            {"text": self._texts[idx], "car_model": model, "distance": distance, "chunk_index": chunk_index}
+            for idx, model, distance, chunk_index in zip(
+                ids.tolist(), models, distances.tolist(), metadata.chunk_indices[ids].tolist()
+            )
+        ]
+        if self._embeddings is not None:
+            embeddings = np.asarray(self._embeddings[ids], dtype=np.float32)
+            for result, embedding in zip(results, embeddings):
+                result["embedding"] = embedding
         return results
     
     def simple_keyword_search(self, query: str, car_model: str = None, top_k: int = 5) -> List[Dict]:
-        """Fallback simple keyword-based search."""
-        query_words = set(query.lower().split())
-        results = []
+        """
+        Fallback keyword-based search.
+        Scores chunks by the number of distinct query words they contain,
+        using the inverted index instead of scanning every chunk.
+        """
+        if self._vocabulary is None or self._postings_source is not self.manuals_data:
+            self._build_postings()
         
-        for model, data in self.manuals_data.items():
-            if car_model and model != car_model:
-                continue
-            
-            for idx, chunk in enumerate(data["chunks"]):
-                chunk_text_lower = chunk["text"].lower()
-                score = sum(1 for word in query_words if word in chunk_text_lower)
-                
-                if score > 0:
-                    results.append({
-                        "text": chunk["text"],
-                        "car_model": model,
-                        "score": score,
-                        "chunk_index": idx
-                    })
-        
-        # Sort by score and return top_k
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:top_k]
+        query_words = set(_TOKEN_RE.findall(query.lower()))
+        term_ids = np.array(
+            [self._vocabulary[word] for word in query_words if word in self._vocabulary], dtype=np.int64
+        )
+        if not len(term_ids):
+            return []
+        
+        scores = _score_postings(self._posting_ids, self._posting_offsets, term_ids, len(self._posting_chunks))
+        if car_model:
+            if car_model not in self._posting_models:
+                return []
+            scores[self._posting_model_ids != self._posting_models.index(car_model)] = 0
+        
+        # Only matching chunks compete; select the top_k of them in linear time
+        candidates = np.flatnonzero(scores)
+        if top_k <= 0 or not len(candidates):
+            return []
+        candidate_scores = scores[candidates]
+        if len(candidates) > top_k:
+            threshold = candidate_scores[np.argpartition(-candidate_scores, top_k - 1)[top_k - 1]]
+            # Keep everything above the cut-off score and the earliest chunks that tie with it
+            above = candidate_scores > threshold
+            tied = np.flatnonzero(candidate_scores == threshold)[:top_k - int(above.sum())]
+            above[tied] = True
+            candidates, candidate_scores = candidates[above], candidate_scores[above]
+        
+        # Highest score first, ties kept in manual/chunk order
+        order = np.lexsort((candidates, -candidate_scores))
+        
+        results = []
+        for chunk_id, score in zip(candidates[order].tolist(), candidate_scores[order].tolist()):
+            model, idx = self._posting_chunks[chunk_id]
+            results.append({
+                "text": self._posting_texts[chunk_id],
+                "car_model": model,
+                "score": score,
+                "chunk_index": idx
+            })
+        return results
     
     def hybrid_search(self, query: str, car_model: str = None, top_k: int = 10) -> List[Dict]:
         """
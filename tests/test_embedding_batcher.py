@@ -0,0 +1,91 @@
+"""
+Unit tests for embedding batcher module.
+Tests coalescing of concurrent encode requests.
+"""
+
+import unittest
+import sys
+import os
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from embedding_batcher import EmbeddingBatcher
+
+
+class CountingModel:
+    """Stand-in for a SentenceTransformer that records batch sizes."""
+    
+    def __init__(self):
+        self.batch_sizes = []
+    
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        self.batch_sizes.append(len(texts))
+        vectors = np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+class TestEmbeddingBatcher(unittest.TestCase):
+    """Test cases for EmbeddingBatcher class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.model = CountingModel()
+        self.batcher = EmbeddingBatcher(self.model, max_batch=64, max_wait_ms=50)
+    
+    def test_encode_matches_model(self):
+        """Test batched output matches direct model output."""
+        texts = ["engine oil", "tire pressure check"]
+        
+        result = self.batcher.encode(texts, normalize_embeddings=True)
+        expected = self.model.encode(texts, normalize_embeddings=True)
+        
+        self.assertTrue(np.allclose(result, expected))
+    
+    def test_single_text_returns_vector(self):
+        """Test encoding a single string returns a 1D vector."""
+        result = self.batcher.encode("engine oil")
+        
+        self.assertEqual(result.shape, (2,))
+    
+    def test_concurrent_requests_share_batches(self):
+        """Test concurrent callers are served by fewer model calls."""
+        results = {}
+        
+        def worker(i):
+            results[i] = self.batcher.encode([f"query {i}"])
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(results), 8)
+        self.assertEqual(sum(self.model.batch_sizes), 8)
+        self.assertLess(len(self.model.batch_sizes), 8)
+    
+    def test_worker_failure_reaches_callers(self):
+        """Test an error that stops the worker is raised to callers and the worker restarts."""
+        class Abort(BaseException):
+            pass
+        
+        class AbortingModel:
+            def encode(self, texts, **kwargs):
+                raise Abort()
+        
+        self.batcher.model = AbortingModel()
+        with self.assertRaises(Abort):
+            self.batcher.encode(["engine oil"])
+        
+        self.batcher.model = self.model
+        self.assertEqual(self.batcher.encode(["engine oil"]).shape, (1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,9 +10,28 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import numpy as np
+
 from evaluation import AnswerEvaluator, track_response_time
 
 
+class FakeEmbeddingModel:
+    """Deterministic stand-in for a SentenceTransformer that counts encode calls."""
+    
+    def __init__(self):
+        self.encode_calls = 0
+    
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        self.encode_calls += 1
+        vectors = np.array([
+            [len(text) + 1.0, text.lower().count("oil") + 1.0, 1.0]
+            for text in texts
+        ], dtype=np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
 class TestAnswerEvaluator(unittest.TestCase):
     """Test cases for AnswerEvaluator class."""
     
@@ -80,6 +99,15 @@ class TestAnswerEvaluator(unittest.TestCase):
             self.assertGreaterEqual(value, 0.0)
             self.assertLessEqual(value, 1.0)
     
+    def test_not_found_answer_is_skipped(self):
+        """Test that "not found" fallback answers skip evaluation."""
+        answer = "I couldn't find relevant information in the manual to answer your question."
+        
+        metrics = self.evaluator.evaluate_answer("How to fix?", answer, ["Some context."])
+        
+        self.assertTrue(metrics['skipped'])
+        self.assertEqual(metrics['overall_score'], 0.0)
+    
     def test_quality_rating(self):
         """Test quality rating conversion."""
         rating, emoji = self.evaluator.get_quality_rating(0.85)
@@ -117,6 +145,118 @@ class TestAnswerEvaluator(unittest.TestCase):
         
         self.assertGreater(score, 0.5)  # Should have good overlap
         self.assertLessEqual(score, 1.0)
+    
+    def test_split_sentences(self):
+        """Test sentence splitting keeps terminators and drops empty pieces."""
+        sentences = self.evaluator._split_sentences("Use SAE 5W-30. Change it yearly!  Why? ok")
+        
+        self.assertEqual(sentences, ["Use SAE 5W-30.", "Change it yearly!", "Why?", "ok"])
+        self.assertEqual(self.evaluator._split_sentences("..."), [])
+
+
+class TestBatchedEvaluation(unittest.TestCase):
+    """Test cases for embedding-based evaluation."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.model = FakeEmbeddingModel()
+        self.evaluator = AnswerEvaluator(embedding_model=self.model)
+    
+    def test_evaluate_answer_single_encode(self):
+        """Test that evaluation embeds everything in one batched call."""
+        question = "What is the engine oil specification?"
+        answer = "Use SAE 5W-30 engine oil. Change it every 10000 km."
+        context = [
+            "The recommended engine oil is SAE 5W-30.",
+            "Change the oil every 10000 km.",
+            "Check tire pressure monthly."
+        ]
+        
+        metrics = self.evaluator.evaluate_answer(question, answer, context)
+        
+        self.assertEqual(self.model.encode_calls, 1)
+        for key in ('answer_relevance', 'faithfulness', 'context_relevance', 'overall_score'):
+            self.assertIn(key, metrics)
+            self.assertGreaterEqual(metrics[key], 0.0)
+            self.assertLessEqual(metrics[key], 1.0)
+    
+    def test_evaluate_answer_matches_individual_metrics(self):
+        """Test batched scores agree with the per-metric methods."""
+        question = "Which engine oil to use?"
+        answer = "Use SAE 5W-30 engine oil."
+        context = ["The recommended engine oil is SAE 5W-30."]
+        
+        metrics = self.evaluator.evaluate_answer(question, answer, context)
+        
+        self.assertAlmostEqual(
+            metrics['answer_relevance'],
+            self.evaluator.calculate_answer_relevance(question, answer),
+            places=5
+        )
+        self.assertAlmostEqual(
+            metrics['faithfulness'],
+            self.evaluator.calculate_faithfulness(answer, context),
+            places=5
+        )
+    
+    def test_precomputed_context_embeddings_are_reused(self):
+        """Test chunks with precomputed embeddings are not re-encoded."""
+        question = "Which engine oil to use?"
+        answer = "Use SAE 5W-30 engine oil."
+        context = ["The recommended engine oil is SAE 5W-30."]
+        
+        reference = AnswerEvaluator(embedding_model=FakeEmbeddingModel())
+        expected = reference.evaluate_answer(question, answer, context)
+        chunk_embedding = FakeEmbeddingModel().encode(context, normalize_embeddings=True)[0]
+        
+        metrics = self.evaluator.evaluate_answer(
+            question, answer, context, context_embeddings=[chunk_embedding.astype(np.float16)]
+        )
+        
+        self.assertNotIn(context[0][:4096], self.evaluator._embedding_cache)
+        self.assertAlmostEqual(metrics['context_relevance'], expected['context_relevance'], places=3)
+    
+    def test_repeated_evaluation_uses_cache(self):
+        """Test that re-evaluating identical texts skips the model."""
+        question = "Which engine oil to use?"
+        answer = "Use SAE 5W-30 engine oil."
+        context = ["The recommended engine oil is SAE 5W-30."]
+        
+        first = self.evaluator.evaluate_answer(question, answer, context)
+        calls = self.model.encode_calls
+        second = self.evaluator.evaluate_answer(question, answer, context)
+        
+        self.assertEqual(self.model.encode_calls, calls)
+        self.assertEqual(first, second)
+    
+    def test_context_embedding_shared_across_metrics(self):
+        """Test the combined context is embedded once for evaluation and faithfulness."""
+        context = ["The recommended engine oil is SAE 5W-30.", "Change the oil yearly."]
+        
+        self.evaluator.evaluate_answer("Which oil?", "Use SAE 5W-30 oil.", context)
+        calls = self.model.encode_calls
+        self.evaluator.calculate_faithfulness("Use SAE 5W-30 oil.", context)
+        
+        self.assertEqual(self.model.encode_calls, calls)
+        self.assertEqual(len(self.evaluator._context_embedding_cache), 1)
+    
+    def test_metrics_cache_returns_copy(self):
+        """Test that cached metrics cannot be mutated by callers."""
+        context = ["The recommended engine oil is SAE 5W-30."]
+        
+        first = self.evaluator.evaluate_answer("Which oil?", "Use SAE 5W-30.", context)
+        first['answer_relevance'] = -1.0
+        second = self.evaluator.evaluate_answer("Which oil?", "Use SAE 5W-30.", context)
+        
+        self.assertGreaterEqual(second['answer_relevance'], 0.0)
+        self.assertEqual(len(self.evaluator._metrics_cache), 1)
+    
+    def test_evaluate_answer_empty_context(self):
+        """Test batched evaluation without context."""
+        metrics = self.evaluator.evaluate_answer("question?", "answer", [])
+        
+        self.assertEqual(metrics['faithfulness'], 0.0)
+        self.assertEqual(metrics['context_relevance'], 0.0)
 
 
 class TestResponseTimeDecorator(unittest.TestCase):
@@ -148,6 +288,20 @@ class TestResponseTimeDecorator(unittest.TestCase):
         
         # Should return original value if not dict
         self.assertEqual(result, "string result")
+    
+    def test_decorator_with_coroutine(self):
+        """Test that decorator times awaited coroutine functions."""
+        import asyncio
+        
+        @track_response_time
+        async def sample_coroutine():
+            await asyncio.sleep(0.001)
+            return {"answer": "test"}
+        
+        result = asyncio.run(sample_coroutine())
+        
+        self.assertIn('response_time', result)
+        self.assertGreaterEqual(result['response_time'], 0.001)
 
 
 if __name__ == '__main__':
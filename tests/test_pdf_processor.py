@@ -6,6 +6,8 @@ Tests PDF processing and text chunking functionality.
 import unittest
 import sys
 import os
+import json
+import tempfile
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -37,6 +39,11 @@ class TestCarModelDetection(unittest.TestCase):
         """Test case insensitive model detection."""
         self.assertEqual(detect_car_model("MG ASTOR"), "MG Astor")
         self.assertEqual(detect_car_model("tata tiago"), "Tata Tiago")
+    
+    def test_detection_matches_whole_words(self):
+        """Test keywords inside other words are ignored and the first mention wins."""
+        self.assertIsNone(detect_car_model("Where is the image metadata?"))
+        self.assertEqual(detect_car_model("Is the Tiago bigger than the Astor?"), "Tata Tiago")
 
 
 class TestPDFProcessor(unittest.TestCase):
@@ -78,6 +85,19 @@ class TestPDFProcessor(unittest.TestCase):
         self.assertEqual(len(chunks), 1)
         self.assertEqual(chunks[0]['text'], text)
     
+    def test_chunk_text_matches_word_windows(self):
+        """Test chunks equal their word windows joined by single spaces, whatever the PDF whitespace."""
+        separators = [" ", "\n", "  ", " \n\t", "\r\n"]
+        text = "\n " + "".join(f"w{i}{separators[i % len(separators)]}" for i in range(450))
+        words = text.split()
+        
+        chunks = self.processor.chunk_text(text)
+        
+        for chunk, i in zip(chunks, range(0, len(words), 150)):
+            self.assertEqual(chunk['text'], " ".join(words[i:i + 200]))
+        self.assertEqual(len(chunks), len(range(0, len(words), 150)))
+        self.assertEqual(chunks[-1]['end_word'], len(words))
+    
     def test_chunk_overlap(self):
         """Test that chunks have proper overlap."""
         words = ["word"] * 700
@@ -92,6 +112,28 @@ class TestPDFProcessor(unittest.TestCase):
             
             # Second chunk should start before first chunk ends (overlap)
             self.assertLess(chunk2_start, chunk1_end)
+    
+    def test_save_and_load_processed_data(self):
+        """Test processed data round-trips through NDJSON and legacy JSON files."""
+        self.processor.manuals_data = {
+            "MG Astor": {
+                "car_model": "MG Astor",
+                "chunks": [{"text": "Engine oil\nSAE 5W-30", "start_word": 0, "end_word": 3}],
+                "total_chunks": 1
+            },
+            "Tata Tiago": {"car_model": "Tata Tiago", "chunks": [], "total_chunks": 0}
+        }
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        path = os.path.join(work_dir.name, "processed_manuals.json")
+        
+        self.processor.save_processed_data(path)
+        self.assertEqual(PDFProcessor().load_processed_data(path), self.processor.manuals_data)
+        
+        # Files written by earlier versions are a single JSON document
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.processor.manuals_data, f, indent=2)
+        self.assertEqual(PDFProcessor().load_processed_data(path), self.processor.manuals_data)
 
 
 if __name__ == '__main__':
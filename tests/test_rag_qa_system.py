@@ -0,0 +1,98 @@
+"""
+Unit tests for RAG Q&A system module.
+Tests the LLM answer cache.
+"""
+
+import unittest
+import sys
+import os
+import asyncio
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_qa_system import RAGQASystem
+
+
+class TestAnswerCache(unittest.TestCase):
+    """Test cases for the LLM answer cache."""
+    
+    def setUp(self):
+        """Set up a system with a stand-in LLM and its cache in a temporary directory."""
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+        self.prompts = []
+        self.system = self.make_system()
+        self.results = [
+            {"car_model": "Car A", "chunk_index": 0, "text": "Engine oil: SAE 5W-30"},
+            {"car_model": "Car A", "chunk_index": 1, "text": "Oil capacity: 4.2 litres"}
+        ]
+    
+    def make_system(self, provider="openai"):
+        """Create a system whose LLM records each question it is asked."""
+        system = RAGQASystem(use_llm=False, cache_dir=self.cache_dir)
+        system.use_llm = True
+        system.llm_provider = provider
+        
+        def generate(question, search_results):
+            self.prompts.append(question)
+            return f"answer {len(self.prompts)}"
+        
+        system._generate_with_openai = generate
+        system._generate_with_ollama = generate
+        return system
+    
+    def answer(self, system, question, results):
+        return asyncio.run(system._agenerate_text(question, results))
+    
+    def test_repeated_question_is_cached(self):
+        """Test the same question over the same chunks calls the LLM once."""
+        first = self.answer(self.system, "What oil?", self.results)
+        second = self.answer(self.system, "  what   OIL? ", self.results)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.prompts), 1)
+    
+    def test_key_depends_on_provider(self):
+        """Test answers from one provider are not reused for another."""
+        openai_key = self.system._answer_cache_key("What oil?", self.results)
+        ollama_key = self.make_system("ollama")._answer_cache_key("What oil?", self.results)
+        
+        self.assertNotEqual(openai_key, ollama_key)
+    
+    def test_key_depends_on_retrieved_chunks(self):
+        """Test a changed chunk text or ranking gives a new key."""
+        key = self.system._answer_cache_key("What oil?", self.results)
+        edited = [dict(self.results[0], text="Engine oil: SAE 0W-20"), self.results[1]]
+        
+        self.assertNotEqual(key, self.system._answer_cache_key("What oil?", edited))
+        self.assertNotEqual(key, self.system._answer_cache_key("What oil?", self.results[::-1]))
+    
+    def test_answers_persist_across_instances(self):
+        """Test a new system over the same cache directory reuses stored answers."""
+        first = self.answer(self.system, "What oil?", self.results)
+        
+        second = self.answer(self.make_system(), "What oil?", self.results)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.prompts), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, "llm_cache.sqlite")))
+
+
+class TestGenerateAnswer(unittest.TestCase):
+    """Test cases for answer generation."""
+    
+    def test_no_results_skips_metrics(self):
+        """Test an answer without retrieved chunks is marked as not evaluated."""
+        system = RAGQASystem(use_llm=False, cache_dir=None)
+        
+        response = system.generate_answer("What oil?", [])
+        
+        self.assertEqual(response["confidence"], "low")
+        self.assertTrue(response["metrics"]["skipped"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,11 +6,36 @@ Tests semantic search functionality.
 import unittest
 import sys
 import os
+import tempfile
+import types
+import zlib
+import numpy as np
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from search_engine import ManualSearchEngine
+import search_engine
+from search_engine import (
+    ManualSearchEngine, ChunkEmbeddingCache, ChunkTextStore, ChunkMetadata, chunk_cache_key
+)
+
+
+class BagOfWordsModel:
+    """Deterministic stand-in encoder: hashed word counts, recording every encoded text."""
+    
+    device = types.SimpleNamespace(type="cpu")
+    
+    def __init__(self, dimension=64):
+        self.dimension = dimension
+        self.encoded = []
+    
+    def encode(self, sentences, **kwargs):
+        self.encoded.extend(sentences)
+        vectors = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for word in sentence.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % self.dimension] += 1.0
+        return vectors
 
 
 class TestManualSearchEngine(unittest.TestCase):
@@ -82,6 +107,38 @@ class TestManualSearchEngine(unittest.TestCase):
         # Should be same embedding
         self.assertTrue((embedding1 == embedding2).all())
     
+    def test_query_cache_evicts_least_recently_used(self):
+        """Test a cache hit protects a query from eviction."""
+        class FakeEncoder:
+            def encode(self, sentences, **kwargs):
+                return np.ones((len(sentences), 4), dtype=np.float32)
+        
+        self.search_engine.query_encoder = FakeEncoder()
+        self.search_engine._cache_size = 2
+        self.search_engine._get_cached_embedding("first")
+        self.search_engine._get_cached_embedding("second")
+        self.search_engine._get_cached_embedding("first")  # Hit refreshes "first"
+        self.search_engine._get_cached_embedding("third")
+        
+        self.assertEqual(list(self.search_engine._query_cache), ["first", "third"])
+    
+    def test_batch_embeddings_encode_misses_once(self):
+        """Test cache misses in a query batch are encoded in a single call."""
+        calls = []
+        
+        class FakeEncoder:
+            def encode(self, sentences, **kwargs):
+                calls.append(list(sentences))
+                return np.full((len(sentences), 4), 2.0, dtype=np.float32)
+        
+        self.search_engine.query_encoder = FakeEncoder()
+        self.search_engine._get_cached_embedding("cached")
+        embeddings = self.search_engine._get_cached_embeddings(["cached", "new", "New "])
+        
+        self.assertEqual(calls, [["cached"], ["new"]])
+        self.assertEqual(embeddings.shape, (3, 4))
+        self.assertTrue(np.allclose(np.linalg.norm(embeddings, axis=1), 1.0))
+    
     def test_simple_keyword_search(self):
         """Test keyword-based search fallback."""
         sample_data = {
@@ -104,6 +161,334 @@ class TestManualSearchEngine(unittest.TestCase):
         self.assertIsInstance(results, list)
         if len(results) > 0:
             self.assertIn("engine", results[0]["text"].lower())
+    
+    def test_keyword_search_ranking_and_filter(self):
+        """Test keyword search ranks by matched words and filters by car model."""
+        self.search_engine.manuals_data = {
+            "Car A": {"car_model": "Car A", "chunks": [
+                {"text": "Check the engine.", "start_word": 0, "end_word": 3},
+                {"text": "Engine oil: SAE 5W-30", "start_word": 3, "end_word": 7}
+            ]},
+            "Car B": {"car_model": "Car B", "chunks": [
+                {"text": "Engine oil capacity", "start_word": 0, "end_word": 3}
+            ]}
+        }
+        
+        results = self.search_engine.simple_keyword_search("engine oil?", top_k=5)
+        self.assertEqual([(r["car_model"], r["chunk_index"], r["score"]) for r in results],
+                         [("Car A", 1, 2), ("Car B", 0, 2), ("Car A", 0, 1)])
+        
+        results = self.search_engine.simple_keyword_search("engine oil", car_model="Car B")
+        self.assertEqual([r["car_model"] for r in results], ["Car B"])
+
+
+class TestIndexPersistence(unittest.TestCase):
+    """Test cases for building, saving and updating the index with a fake encoder."""
+    
+    def setUp(self):
+        """Set up manuals and a temporary directory for the index files."""
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = work_dir.name
+        self.manuals = {
+            "Car A": {"car_model": "Car A", "chunks": [
+                {"text": "engine oil SAE 5W-30", "start_word": 0, "end_word": 4},
+                {"text": "tire pressure 32 PSI", "start_word": 4, "end_word": 8}
+            ]}
+        }
+    
+    def make_engine(self, index_name="faiss_index.bin", model=None):
+        """Create an engine over a fake encoder, keeping its files in the temporary directory."""
+        model = model or BagOfWordsModel()
+        return ManualSearchEngine(index_path=os.path.join(self.work_dir, index_name), model=model,
+                                  query_encoder=model, cache_dir=os.path.join(self.work_dir, "embedding_cache"))
+    
+    def test_missing_chunk_texts_reject_saved_index(self):
+        """Test a saved index is not loaded once its chunk text store is gone."""
+        engine = self.make_engine()
+        engine.build_index(self.manuals, force_rebuild=True)
+        os.remove(engine._texts.texts_path)
+        
+        engine = self.make_engine()
+        self.assertFalse(engine.load_index())
+        self.assertIsNone(engine.index)
+        
+        engine.build_index(self.manuals)
+        self.assertEqual(engine.search("tire pressure", top_k=1)[0]["text"], "tire pressure 32 PSI")
+    
+    def test_index_paths_keep_separate_chunk_texts(self):
+        """Test engines with different index paths do not overwrite each other's files."""
+        self.make_engine("a.bin").build_index(self.manuals, force_rebuild=True)
+        self.make_engine("b.bin").build_index(
+            {"Car B": {"car_model": "Car B", "chunks": [
+                {"text": "coolant level check", "start_word": 0, "end_word": 3}
+            ]}}, force_rebuild=True)
+    
+        engine = self.make_engine("a.bin")
+        self.assertTrue(engine.load_index())
+        self.assertEqual(engine.search("tire pressure", top_k=1)[0]["text"], "tire pressure 32 PSI")
+    
+    def test_build_index_appends_new_manual(self):
+        """Test rebuilding after a manual is appended encodes only its chunks."""
+        self.make_engine().build_index(self.manuals, force_rebuild=True)
+        self.manuals["Car B"] = {"car_model": "Car B", "chunks": [
+            {"text": "coolant level check", "start_word": 0, "end_word": 3},
+            {"text": "wiper blade size", "start_word": 3, "end_word": 6}
+        ]}
+        
+        engine = self.make_engine()
+        engine.build_index(self.manuals)
+        
+        self.assertEqual(engine.model.encoded, ["coolant level check", "wiper blade size"])
+        self.assertEqual(engine.index.ntotal, 4)
+        result = engine.search("coolant level", top_k=1)[0]
+        self.assertEqual((result["car_model"], result["text"]), ("Car B", "coolant level check"))
+    
+    def test_filtered_search_fills_top_k_for_minority_model(self):
+        """Test a car model filter returns a full top_k of that model's chunks only."""
+        self.manuals["Car A"]["chunks"] = [
+            {"text": f"engine oil change step {i}", "start_word": i, "end_word": i + 1} for i in range(40)
+        ]
+        self.manuals["Car B"] = {"car_model": "Car B", "chunks": [
+            {"text": "engine oil capacity", "start_word": 0, "end_word": 3},
+            {"text": "tire pressure", "start_word": 3, "end_word": 5},
+            {"text": "fuse box location", "start_word": 5, "end_word": 8}
+        ]}
+        engine = self.make_engine()
+        engine.build_index(self.manuals, force_rebuild=True)
+        
+        results = engine.search("engine oil change", car_model="Car B", top_k=3)
+        
+        self.assertEqual(len(results), 3)
+        self.assertEqual({r["car_model"] for r in results}, {"Car B"})
+        self.assertEqual(results[0]["text"], "engine oil capacity")
+    
+    def test_add_manual_encodes_only_new_chunks(self):
+        """Test an added manual is searchable and only its chunks are encoded."""
+        engine = self.make_engine()
+        engine.build_index(self.manuals, force_rebuild=True)
+        engine.model.encoded.clear()
+        
+        engine.add_manual("Car B", [{"text": "brake fluid DOT 4", "start_word": 0, "end_word": 3}])
+        
+        self.assertEqual(engine.model.encoded, ["brake fluid DOT 4"])
+        result = engine.search("brake fluid", top_k=1)[0]
+        self.assertEqual((result["car_model"], result["text"]), ("Car B", "brake fluid DOT 4"))
+        self.assertEqual(engine.search("tire pressure", top_k=1)[0]["text"], "tire pressure 32 PSI")
+    
+    def count_index_searches(self, engine):
+        """Record the queries of every search that reaches the index."""
+        searched = []
+        search_index = engine._search_index
+        
+        def counting_search_index(queries, car_model, top_k):
+            searched.extend(queries)
+            return search_index(queries, car_model, top_k)
+        
+        engine._search_index = counting_search_index
+        return searched
+    
+    def test_repeated_query_uses_result_cache(self):
+        """Test a repeated query is answered without searching the index again."""
+        engine = self.make_engine()
+        engine.build_index(self.manuals, force_rebuild=True)
+        searched = self.count_index_searches(engine)
+        
+        first = engine.search("Engine oil", top_k=1)
+        first[0]["distance"] = None  # Callers get copies of the cached results
+        second = engine.search("engine oil ", top_k=1)
+        
+        self.assertEqual(searched, ["Engine oil"])
+        self.assertEqual(second[0]["text"], "engine oil SAE 5W-30")
+        self.assertIsNotNone(second[0]["distance"])
+    
+    def test_index_changes_clear_result_cache(self):
+        """Test a rebuild or an added manual invalidates cached results."""
+        engine = self.make_engine()
+        engine.build_index(self.manuals, force_rebuild=True)
+        searched = self.count_index_searches(engine)
+        
+        engine.search("brake fluid", top_k=1)
+        engine.add_manual("Car B", [{"text": "brake fluid DOT 4", "start_word": 0, "end_word": 3}])
+        self.assertEqual(engine.search("brake fluid", top_k=1)[0]["text"], "brake fluid DOT 4")
+        
+        engine.build_index(self.manuals, force_rebuild=True)
+        self.assertEqual(engine.search("brake fluid", top_k=1)[0]["car_model"], "Car A")
+        self.assertEqual(searched, ["brake fluid"] * 3)
+    
+    def test_rebuild_if_stale_rebuilds_changed_manual(self):
+        """Test an edited manual triggers a rebuild that encodes only the edited chunk."""
+        self.make_engine().build_index(self.manuals, force_rebuild=True)
+        self.manuals["Car A"]["chunks"][1]["text"] = "tire pressure 35 PSI"
+        
+        engine = self.make_engine()
+        self.assertTrue(engine.rebuild_if_stale(self.manuals))
+        self.assertEqual(engine.model.encoded, ["tire pressure 35 PSI"])
+        self.assertEqual(engine.search("tire pressure", top_k=1)[0]["text"], "tire pressure 35 PSI")
+    
+    def test_rebuild_if_stale_keeps_unchanged_index(self):
+        """Test an unchanged corpus reuses the saved index without encoding anything."""
+        self.make_engine().build_index(self.manuals, force_rebuild=True)
+        
+        engine = self.make_engine()
+        self.assertFalse(engine.rebuild_if_stale(self.manuals))
+        self.assertEqual(engine.model.encoded, [])
+        self.assertEqual(engine.index.ntotal, 2)
+    
+    def test_unchanged_index_loads_without_hashing(self):
+        """Test files whose size and mtime match the stamp file are not hashed again."""
+        self.make_engine().build_index(self.manuals, force_rebuild=True)
+        hashed = []
+        file_sha256 = search_engine._file_sha256
+        
+        def counting_file_sha256(path):
+            hashed.append(path)
+            return file_sha256(path)
+        
+        search_engine._file_sha256 = counting_file_sha256
+        self.addCleanup(setattr, search_engine, "_file_sha256", file_sha256)
+        
+        self.assertTrue(self.make_engine().load_index())
+        self.assertEqual(hashed, [])
+        
+        os.remove(self.make_engine().stamp_path)
+        self.assertTrue(self.make_engine().load_index())
+        self.assertNotEqual(hashed, [])
+    
+    def test_checksums_cover_paths_with_spaces_and_embeddings(self):
+        """Test an index path with spaces reloads, and altered embeddings reject the index."""
+        model = BagOfWordsModel()
+        self.make_engine("car index.bin", model).build_index(self.manuals, force_rebuild=True)
+        self.assertTrue(self.make_engine("car index.bin", model).load_index())
+        
+        engine = self.make_engine("car index.bin", model)
+        np.save(engine.embeddings_path, np.zeros((2, model.dimension), dtype=np.float16))
+        self.assertFalse(engine.load_index())
+
+
+class TestChunkEmbeddingCache(unittest.TestCase):
+    """Test cases for the per-chunk embedding cache."""
+    
+    def setUp(self):
+        """Set up a cache in a temporary directory."""
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+        self.cache = ChunkEmbeddingCache(self.cache_dir, "test-model")
+    
+    def test_store_and_lookup(self):
+        """Test stored vectors are returned for hits and misses are reported."""
+        keys = [chunk_cache_key("engine oil"), chunk_cache_key("tire pressure")]
+        vectors = np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+        self.cache.store(keys, vectors)
+        
+        # Reopen from disk to check persistence
+        cache = ChunkEmbeddingCache(self.cache_dir, "test-model")
+        embeddings, missing = cache.lookup([keys[1], chunk_cache_key("new chunk"), keys[0]])
+        
+        self.assertEqual(missing, [1])
+        np.testing.assert_array_equal(embeddings[0], vectors[1])
+        np.testing.assert_array_equal(embeddings[2], vectors[0])
+    
+    def test_other_model_is_ignored(self):
+        """Test entries written by a different model are not reused."""
+        key = chunk_cache_key("engine oil")
+        self.cache.store([key], np.ones((1, 2), dtype=np.float32))
+        
+        cache = ChunkEmbeddingCache(self.cache_dir, "other-model")
+        embeddings, missing = cache.lookup([key])
+        
+        self.assertIsNone(embeddings)
+        self.assertEqual(missing, [0])
+    
+    def test_other_precision_is_ignored(self):
+        """Test entries encoded at another device or precision are not reused."""
+        key = chunk_cache_key("engine oil")
+        ChunkEmbeddingCache(self.cache_dir, "test-model", "cpu/float32").store(
+            [key], np.ones((1, 2), dtype=np.float32))
+        
+        cache = ChunkEmbeddingCache(self.cache_dir, "test-model", "cuda/float16")
+        embeddings, missing = cache.lookup([key])
+        
+        self.assertIsNone(embeddings)
+        self.assertEqual(missing, [0])
+    
+    def test_truncated_vectors_file(self):
+        """Test a partially written row is dropped and later rows stay aligned."""
+        keys = [chunk_cache_key("engine oil"), chunk_cache_key("tire pressure")]
+        self.cache.store(keys, np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32))
+        os.truncate(self.cache.vectors_path, os.path.getsize(self.cache.vectors_path) - 1)
+        
+        cache = ChunkEmbeddingCache(self.cache_dir, "test-model")
+        embeddings, missing = cache.lookup(keys)
+        self.assertEqual(missing, [1])
+        np.testing.assert_array_equal(embeddings[0], [1.0, 0.0])
+        
+        cache.store([keys[1]], np.array([[0.0, 2.0]], dtype=np.float32))
+        embeddings, missing = ChunkEmbeddingCache(self.cache_dir, "test-model").lookup(keys)
+        self.assertEqual(missing, [])
+        np.testing.assert_array_equal(embeddings, [[1.0, 0.0], [0.0, 2.0]])
+
+
+class TestChunkTextStore(unittest.TestCase):
+    """Test cases for the memory-mapped chunk text store."""
+    
+    def make_work_dir(self):
+        """Create a temporary directory removed after the test."""
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        return work_dir.name
+    
+    def test_write_and_read(self):
+        """Test texts round-trip by row, including non-ASCII and empty texts."""
+        work_dir = self.make_work_dir()
+        texts = ["Engine oil SAE 5W-30", "", "Reifendruck prüfen ✓"]
+        store = ChunkTextStore(os.path.join(work_dir, "chunks.bin"), os.path.join(work_dir, "offsets.npy"))
+        store.write(texts)
+        
+        reopened = ChunkTextStore(store.texts_path, store.offsets_path)
+        self.assertTrue(reopened.open())
+        self.assertEqual(len(reopened), 3)
+        self.assertEqual([reopened[i] for i in range(3)], texts)
+    
+    def test_append(self):
+        """Test appended texts follow the stored ones."""
+        work_dir = self.make_work_dir()
+        store = ChunkTextStore(os.path.join(work_dir, "chunks.bin"), os.path.join(work_dir, "offsets.npy"))
+        store.write(["Engine oil", "Tire pressure"])
+        store.append(["Brake fluid ✓", ""])
+        
+        reopened = ChunkTextStore(store.texts_path, store.offsets_path)
+        self.assertTrue(reopened.open())
+        self.assertEqual([reopened[i] for i in range(len(reopened))],
+                         ["Engine oil", "Tire pressure", "Brake fluid ✓", ""])
+
+
+class TestChunkMetadata(unittest.TestCase):
+    """Test cases for the columnar chunk metadata table."""
+    
+    def test_save_load_and_append(self):
+        """Test rows round-trip through disk and appended models get new codes."""
+        metadata = ChunkMetadata.from_records([
+            {"car_model": "Car A", "chunk_index": 0, "start_word": 0, "end_word": 5, "key": "aa"},
+            {"car_model": "Car A", "chunk_index": 1, "start_word": 5, "end_word": 9, "key": "bb"}
+        ])
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        path = os.path.join(work_dir.name, "metadata.npz")
+        metadata.save(path)
+        
+        loaded = ChunkMetadata.load(path) + ChunkMetadata.from_records([
+            {"car_model": "Car B", "key": "cc"},
+            {"car_model": "Car A", "chunk_index": 2, "key": "dd"}
+        ])
+        
+        self.assertEqual(len(loaded), 4)
+        self.assertEqual(loaded[1], {"car_model": "Car A", "chunk_index": 1,
+                                     "start_word": 5, "end_word": 9, "key": "bb"})
+        self.assertEqual(loaded.car_models(), ["Car A", "Car A", "Car B", "Car A"])
+        self.assertEqual(loaded.model_id("Car B"), 1)
+        self.assertIsNone(loaded.model_id("Car C"))
 
 
 if __name__ == '__main__':